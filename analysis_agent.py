@@ -1,6 +1,9 @@
 import os
+import json
 import tempfile
-from typing import Dict, Any
+from typing import Dict, Any, List
+import requests
+from requests.adapters import HTTPAdapter
 import dashscope
 from dashscope import MultiModalConversation, Generation
 from config import Config
@@ -14,6 +17,18 @@ class AnalysisAgent:
         self.config = Config()
         self._init_dashscope()
 
+        # One pooled session for every model call, so each cycle reuses the
+        # open TLS connection instead of handshaking again; sized for the
+        # concurrent cycles run_batch allows
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def close(self) -> None:
+        """Drop the pooled connections; the next call opens a new one"""
+        self._session.close()
+
     def _init_dashscope(self) -> None:
         """Initialize DashScope API"""
         try:
@@ -44,7 +59,7 @@ class AnalysisAgent:
             prompt = self._create_analysis_prompt(context)
 
             # Try data URL format first (most compatible)
-            data_url = f"data:image/png;base64,{image_base64}"
+            data_url = f"data:image/jpeg;base64,{image_base64}"
 
             # Create DashScope native format message
             messages = [
@@ -57,61 +72,7 @@ class AnalysisAgent:
                 }
             ]
 
-            # Get thinking settings from config
-            enable_thinking = self.config.get_enable_thinking()
-            thinking_budget = self.config.get_thinking_budget()
-
-            # Prepare API call parameters
-            api_params = {
-                "model": self.config.get_model_name(),
-                "messages": messages,
-                "stream": True,
-            }
-
-            # Only add thinking parameters if enabled
-            if enable_thinking:
-                api_params["enable_thinking"] = True
-                api_params["thinking_budget"] = thinking_budget
-                logging.info(f"Calling API with thinking enabled (budget: {thinking_budget})")
-            else:
-                logging.info("Calling API without thinking mode")
-
-            # Call DashScope MultiModalConversation API
-            response = MultiModalConversation.call(**api_params)
-
-            # Check if response is None
-            if response is None:
-                raise Exception("API returned None - this may indicate the model does not support the requested features. Try disabling 'thinking mode' in settings.")
-
-            # Process the streaming response
-            reasoning_content = ""
-            answer_content = ""
-            is_answering = False
-
-            for chunk in response:
-                # Check if chunk has the expected structure
-                if not hasattr(chunk, 'output') or not hasattr(chunk.output, 'choices'):
-                    logging.warning(f"Unexpected chunk structure: {chunk}")
-                    continue
-
-                if not chunk.output.choices:
-                    logging.warning("Empty choices in chunk")
-                    continue
-
-                # Handle empty responses
-                message = chunk.output.choices[0].message
-                reasoning_content_chunk = message.get("reasoning_content", None)
-
-                if (chunk.output.choices[0].message.content == [] and reasoning_content_chunk == ""):
-                    continue
-                else:
-                    # If thinking process
-                    if reasoning_content_chunk is not None and chunk.output.choices[0].message.content == []:
-                        reasoning_content += chunk.output.choices[0].message.reasoning_content
-                    # If answer content
-                    elif chunk.output.choices[0].message.content != []:
-                        is_answering = True
-                        answer_content += chunk.output.choices[0].message.content[0]["text"]
+            answer_content = self._call_model(messages)
 
             # Return the collected answer
             if answer_content.strip():
@@ -142,6 +103,135 @@ class AnalysisAgent:
                 "error": str(e)
             }
 
+    def analyze_screenshots_batch(self, images_base64: List[str], context: str = "") -> List[Dict[str, Any]]:
+        """
+        Analyze several screenshots with a single model request
+
+        The images are sent as one multi-image message and the model is asked
+        for a JSON array with one description per image, so the prompt and
+        request overhead is paid once for the whole batch. If the answer
+        can't be split per image, each screenshot is analyzed on its own.
+
+        Args:
+            images_base64 (List[str]): Base64 encoded screenshots, oldest first
+            context (str): Additional context for analysis
+
+        Returns:
+            List[Dict[str, Any]]: One analysis result per screenshot, in input order
+        """
+        if len(images_base64) <= 1:
+            return [self.analyze_screenshot(image_base64, context) for image_base64 in images_base64]
+
+        try:
+            content = [{"image": f"data:image/jpeg;base64,{image_base64}"} for image_base64 in images_base64]
+            content.append({"text": self._create_batch_analysis_prompt(len(images_base64), context)})
+
+            answer_content = self._call_model([{"role": "user", "content": content}])
+            descriptions = self._parse_batch_answer(answer_content, len(images_base64))
+
+            return [
+                {
+                    "activity_description": description,
+                    "confidence": "high",
+                    "analysis_successful": True,
+                    "error": None
+                }
+                for description in descriptions
+            ]
+
+        except Exception as e:
+            logging.warning(f"Batch analysis failed, analyzing screenshots one by one: {str(e)}")
+            return [self.analyze_screenshot(image_base64, context) for image_base64 in images_base64]
+
+    @staticmethod
+    def _parse_batch_answer(answer_content: str, expected_count: int) -> List[str]:
+        """Extract the per-image descriptions from a batch answer"""
+        text = answer_content.strip()
+
+        # Tolerate the array being wrapped in a Markdown code fence
+        start, end = text.find("["), text.rfind("]")
+        if start == -1 or end < start:
+            raise ValueError("No JSON array in batch answer")
+
+        descriptions = json.loads(text[start:end + 1])
+        if not isinstance(descriptions, list) or len(descriptions) != expected_count:
+            raise ValueError(f"Expected {expected_count} descriptions in batch answer")
+
+        descriptions = [str(description).strip() for description in descriptions]
+        if not all(descriptions):
+            raise ValueError("Empty description in batch answer")
+
+        return descriptions
+
+    def _call_model(self, messages: List[Dict[str, Any]]) -> str:
+        """
+        Send a multimodal conversation to the model and collect the streamed answer
+
+        Args:
+            messages (List[Dict[str, Any]]): DashScope native format messages
+
+        Returns:
+            str: The answer text (reasoning content is discarded)
+        """
+        # Get thinking settings from config
+        enable_thinking = self.config.get_enable_thinking()
+        thinking_budget = self.config.get_thinking_budget()
+
+        # Prepare API call parameters
+        api_params = {
+            "model": self.config.get_model_name(),
+            "messages": messages,
+            "stream": True,
+            "session": self._session,
+        }
+
+        # Only add thinking parameters if enabled
+        if enable_thinking:
+            api_params["enable_thinking"] = True
+            api_params["thinking_budget"] = thinking_budget
+            logging.info(f"Calling API with thinking enabled (budget: {thinking_budget})")
+        else:
+            logging.info("Calling API without thinking mode")
+
+        # Call DashScope MultiModalConversation API
+        response = MultiModalConversation.call(**api_params)
+
+        # Check if response is None
+        if response is None:
+            raise Exception("API returned None - this may indicate the model does not support the requested features. Try disabling 'thinking mode' in settings.")
+
+        # Process the streaming response
+        reasoning_content = ""
+        answer_content = ""
+        is_answering = False
+
+        for chunk in response:
+            # Check if chunk has the expected structure
+            if not hasattr(chunk, 'output') or not hasattr(chunk.output, 'choices'):
+                logging.warning(f"Unexpected chunk structure: {chunk}")
+                continue
+
+            if not chunk.output.choices:
+                logging.warning("Empty choices in chunk")
+                continue
+
+            # Handle empty responses
+            message = chunk.output.choices[0].message
+            reasoning_content_chunk = message.get("reasoning_content", None)
+
+            if (chunk.output.choices[0].message.content == [] and reasoning_content_chunk == ""):
+                continue
+            else:
+                # If thinking process
+                if reasoning_content_chunk is not None and chunk.output.choices[0].message.content == []:
+                    reasoning_content += chunk.output.choices[0].message.reasoning_content
+                # If answer content
+                elif chunk.output.choices[0].message.content != []:
+                    is_answering = True
+                    answer_content += chunk.output.choices[0].message.content[0]["text"]
+
+        return answer_content
+
     def _create_analysis_prompt(self, context: str = "") -> str:
         """
         Create analysis prompt for the AI model
@@ -165,6 +255,30 @@ class AnalysisAgent:
 
         return base_prompt
 
+    def _create_batch_analysis_prompt(self, image_count: int, context: str = "") -> str:
+        """
+        Create the prompt for analyzing several screenshots in one request
+
+        Args:
+            image_count (int): Number of screenshots in the request
+            context (str): Additional context for analysis
+
+        Returns:
+            str: Formatted prompt for batch analysis
+        """
+        base_prompt = f"""以上按时间顺序给出了 {image_count} 张屏幕截图。请分别分析每张截图，描述用户当时正在进行的活动。请用中文回答，并且简洁明了地描述：
+
+1. 用户正在使用什么应用程序或网站
+2. 用户正在进行什么具体活动（比如编程、浏览网页、写文档、看视频等）
+3. 如果能看出来，用户在处理什么具体内容
+
+每张截图用一到两句话简洁地总结。只输出一个 JSON 字符串数组，按截图顺序每张截图对应一个元素，共 {image_count} 个元素，不要输出其他内容。"""
+
+        if context:
+            base_prompt += f"\n\n额外上下文信息：{context}"
+
+        return base_prompt
+
     def analyze_activity_pattern(self, recent_activities: list) -> Dict[str, Any]:
         """
         Analyze patterns in recent activities
@@ -1,5 +1,5 @@
 import os
-import json
+import orjson
 from pathlib import Path
 from dotenv import load_dotenv
 from typing import Optional, Any
@@ -17,17 +17,27 @@ class Config:
     # Screenshot Configuration
     SCREENSHOT_INTERVAL: int = 180  # 3 minutes in seconds
     SCREENSHOT_DIR: str = "screenshots"
+    SCREENSHOT_DEDUP_THRESHOLD: int = 5  # dHash bits that may differ for a screen to count as unchanged (0 = off)
+    UPLOAD_MAX_EDGE: int = 1280  # Longest side in pixels of the image sent for analysis
+    UPLOAD_JPEG_QUALITY: int = 85  # JPEG quality of the image sent for analysis
 
     # Storage Configuration
-    ACTIVITY_LOG_FILE: str = "activity_log.json"
+    ACTIVITY_LOG_FILE: str = "activity_log.jsonl"
+    LEGACY_ACTIVITY_LOG_FILE: str = "activity_log.json"  # Pre-JSONL format, migrated on first run
+    ACTIVITY_FLUSH_BATCH_SIZE: int = 16  # Buffered records that force a write
+    ACTIVITY_FLUSH_INTERVAL: int = 5  # Seconds after the last write before buffered records are written
+    CLEANUP_INTERVAL: int = 600  # Seconds between background cleanups of old screenshots and activities
 
     # LangGraph Configuration
+    USE_LANGGRAPH: bool = False  # Run cycles through the LangGraph graph instead of calling the nodes directly
     MAX_RETRIES: int = 3
     RETRY_DELAY: int = 5
 
     # AI Analysis Configuration
     ENABLE_THINKING: bool = True
     THINKING_BUDGET: int = 50
+    ANALYSIS_BATCH_SIZE: int = 1  # Screenshots analyzed per request in continuous mode (1 = no batching)
+    ANALYSIS_BATCH_MAX_DELAY: int = 600  # Max seconds a screenshot waits for its batch to fill
 
     # GUI configuration file path
     GUI_CONFIG_FILE: str = "gui_config.json"
@@ -38,8 +48,10 @@ class Config:
         try:
             config_path = Path(cls.GUI_CONFIG_FILE)
             if config_path.exists():
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                # Read on every config lookup (several times per cycle), so
+                # parse with orjson like the activity log
+                with open(config_path, 'rb') as f:
+                    return orjson.loads(f.read())
         except Exception:
             pass
         return {}
@@ -115,6 +127,17 @@ class Config:
             return int(thinking_budget)
         return cls.THINKING_BUDGET
 
+    @classmethod
+    def get_analysis_batch_size(cls) -> int:
+        """Get analysis batch size from GUI config, environment, or use default"""
+        gui_config = cls._load_gui_config()
+        batch_size = gui_config.get("recording", {}).get("batch_size")
+        if batch_size:
+            return max(1, int(batch_size))
+
+        # Try environment variable
+        return max(1, int(os.getenv("ANALYSIS_BATCH_SIZE", cls.ANALYSIS_BATCH_SIZE)))
+
     @classmethod
     def validate_config(cls) -> bool:
         """Validate that all required configuration is present"""
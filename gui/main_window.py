@@ -37,8 +37,8 @@ from .widgets.activity_list import ActivityListWidget
 from .widgets.screenshot_preview import ScreenshotPreviewWidget
 
 # Import backend components
+# (workflow pulls in dashscope/langgraph and is imported when recording starts)
 from storage import ActivityStorage
-from workflow import ActivityRecorderWorkflow
 
 
 
@@ -74,6 +74,8 @@ class RecordingWorker(QObject):
         config = self.config or {}
 
         try:
+            from workflow import ActivityRecorderWorkflow
+
             # Initialize workflow with config
             self.workflow = ActivityRecorderWorkflow()
 
@@ -136,6 +138,8 @@ class RecordingWorker(QObject):
     async def _run_continuous_recording(self):
         """Run continuous recording"""
         logging.info("Starting continuous recording loop")
+        # Old screenshots and activities are cleaned up in the background
+        cleanup_task = asyncio.create_task(self.workflow.run_periodic_cleanup())
         try:
             while self.is_running:
                 # Check if stop was requested
@@ -178,6 +182,7 @@ class RecordingWorker(QObject):
             logging.error(f"Recording error: {exc}")
             self.error_occurred.emit(f"录制过程中出错: {str(exc)}")
         finally:
+            cleanup_task.cancel()
             logging.info("Recording loop finished")
             self.is_running = False
 
@@ -206,6 +211,12 @@ class RecordingWorker(QObject):
                     # Close the loop
                     self.loop.close()
 
+            # Write out activities the workflow still has buffered
+            if self.workflow:
+                with contextlib.suppress(Exception):
+                    self.workflow.storage.flush()
+                self.workflow.analysis_agent.close()
+
         finally:
             # Clear references
             self.recording_task = None
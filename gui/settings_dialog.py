@@ -91,7 +91,7 @@ class APITestWorker(QObject):
                 draw.text((20, 110), "测试 API 连接", fill='blue', font=font)
 
                 buffer = io.BytesIO()
-                test_img.save(buffer, format='PNG')
+                test_img.save(buffer, format='JPEG')
                 test_image_b64 = base64.b64encode(buffer.getvalue()).decode()
 
                 # Test analysis
@@ -17,7 +17,6 @@ import logging
 
 # Import backend components
 from storage import ActivityStorage
-from analysis_agent import AnalysisAgent
 
 
 class TimeAnalysisWorker(QObject):
@@ -41,7 +40,8 @@ class TimeAnalysisWorker(QObject):
                 self.analysis_completed.emit("在指定时间段内没有找到活动记录。", [])
                 return
 
-            # Create analysis agent
+            # Create analysis agent (imported lazily, dashscope is heavy)
+            from analysis_agent import AnalysisAgent
             agent = AnalysisAgent()
 
             # Extract activity descriptions for pattern analysis
@@ -7,10 +7,20 @@ from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
     QGroupBox, QProgressBar, QTextEdit
 )
-from PyQt6.QtCore import QTimer, pyqtSignal, Qt
-from PyQt6.QtGui import QFont, QPalette, QColor
+from PyQt6.QtCore import QTimer, pyqtSignal
+from PyQt6.QtGui import QPalette, QColor, QTextCharFormat, QTextCursor
 from datetime import datetime
-import logging
+from collections import deque
+
+
+# Labels for the common intervals offered in the settings dialog
+_INTERVAL_TEXT = {
+    30: "30秒",
+    60: "1分钟",
+    180: "3分钟",
+    300: "5分钟",
+    600: "10分钟",
+}
 
 
 class StatusWidget(QWidget):
@@ -26,6 +36,21 @@ class StatusWidget(QWidget):
         self.is_recording = False
         self.last_activity = "尚未开始录制"
         self.next_capture_time = None
+        self.capture_interval = 180  # Matches the default "3分钟" label
+
+        # Colors are built once and applied via palette / char format,
+        # which avoids re-parsing stylesheet strings on every update
+        self._status_palettes = {
+            False: self._make_text_palette("#666"),
+            True: self._make_text_palette("#28a745"),
+        }
+        self._info_palette = self._make_text_palette("#555")
+        self._log_formats = {
+            "ERROR": self._make_char_format("#dc3545"),
+            "WARNING": self._make_char_format("#ffc107"),
+            "SUCCESS": self._make_char_format("#28a745"),
+        }
+        self._default_log_format = self._make_char_format("#666")
 
         self.init_ui()
         self.setup_timer()
@@ -34,19 +59,36 @@ class StatusWidget(QWidget):
         """Initialize the user interface"""
         layout = QVBoxLayout(self)
 
+        # Button styling is keyed on the dynamic "recording" property
+        # so switching state only repolishes the button.
+        self.setStyleSheet("""
+            QPushButton#startStopButton[recording="true"] {
+                background-color: #dc3545;
+                color: white;
+            }
+            QPushButton#startStopButton[recording="false"] {
+                background-color: #28a745;
+                color: white;
+            }
+        """)
+
         # Control group
         control_group = QGroupBox("录制控制")
         control_layout = QHBoxLayout(control_group)
 
         # Status label
         self.status_label = QLabel("状态: 未录制")
-        self.status_label.setStyleSheet("font-weight: bold; color: #666;")
+        status_font = self.status_label.font()
+        status_font.setBold(True)
+        self.status_label.setFont(status_font)
+        self.status_label.setPalette(self._status_palettes[False])
         control_layout.addWidget(self.status_label)
 
         control_layout.addStretch()
 
         # Control buttons
         self.start_stop_btn = QPushButton("开始录制")
+        self.start_stop_btn.setObjectName("startStopButton")
         self.start_stop_btn.setMinimumWidth(100)
         self.start_stop_btn.clicked.connect(self.toggle_recording)
         control_layout.addWidget(self.start_stop_btn)
@@ -64,17 +106,18 @@ class StatusWidget(QWidget):
 
         # Next capture info
         self.next_capture_label = QLabel("下次截图: -")
-        self.next_capture_label.setStyleSheet("color: #555;")
+        self.next_capture_label.setPalette(self._info_palette)
         info_layout.addWidget(self.next_capture_label)
 
         # Progress bar for countdown
         self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, self.capture_interval)
         self.progress_bar.setVisible(False)
         info_layout.addWidget(self.progress_bar)
 
         # Interval info
         self.interval_label = QLabel("截图间隔: 3分钟")
-        self.interval_label.setStyleSheet("color: #555;")
+        self.interval_label.setPalette(self._info_palette)
         info_layout.addWidget(self.interval_label)
 
         layout.addWidget(info_group)
@@ -106,6 +149,13 @@ class StatusWidget(QWidget):
         self.update_timer.timeout.connect(self.update_display)
         self.update_timer.start(1000)  # Update every second
 
+        # Log messages are queued and written in batches
+        self._log_queue = deque()
+        self._log_flush_timer = QTimer(self)
+        self._log_flush_timer.setSingleShot(True)
+        self._log_flush_timer.setInterval(100)
+        self._log_flush_timer.timeout.connect(self._flush_log)
+
     def toggle_recording(self):
         """Toggle recording state"""
         if self.is_recording:
@@ -115,36 +165,73 @@ class StatusWidget(QWidget):
 
     def set_recording_state(self, recording: bool):
         """Set recording state"""
+        if recording == self.is_recording:
+            return
+
         self.is_recording = recording
 
-        if recording:
-            self.status_label.setText("状态: 正在录制")
-            self.status_label.setStyleSheet("font-weight: bold; color: #28a745;")
-            self.start_stop_btn.setText("停止录制")
-            self.start_stop_btn.setStyleSheet("background-color: #dc3545; color: white;")
-            self.progress_bar.setVisible(True)
-        else:
-            self.status_label.setText("状态: 未录制")
-            self.status_label.setStyleSheet("font-weight: bold; color: #666;")
-            self.start_stop_btn.setText("开始录制")
-            self.start_stop_btn.setStyleSheet("background-color: #28a745; color: white;")
-            self.progress_bar.setVisible(False)
-            self.next_capture_label.setText("下次截图: -")
+        # Collapse the per-widget repaints below into a single update
+        self.setUpdatesEnabled(False)
+        try:
+            self.status_label.setPalette(self._status_palettes[recording])
+            self._apply_recording_property(self.start_stop_btn, recording)
+
+            if recording:
+                self.status_label.setText("状态: 正在录制")
+                self.start_stop_btn.setText("停止录制")
+                self.progress_bar.setVisible(True)
+            else:
+                self.status_label.setText("状态: 未录制")
+                self.start_stop_btn.setText("开始录制")
+                self.progress_bar.setVisible(False)
+                self.next_capture_label.setText("下次截图: -")
+        finally:
+            self.setUpdatesEnabled(True)
+            self.update()
+
+    def _make_text_palette(self, color: str) -> QPalette:
+        """Build a palette with the given text color"""
+        palette = QPalette(self.palette())
+        palette.setColor(QPalette.ColorRole.WindowText, QColor(color))
+        return palette
+
+    @staticmethod
+    def _make_char_format(color: str) -> QTextCharFormat:
+        """Build a text format with the given foreground color"""
+        char_format = QTextCharFormat()
+        char_format.setForeground(QColor(color))
+        return char_format
+
+    @staticmethod
+    def _apply_recording_property(widget: QWidget, recording: bool):
+        """Update the "recording" style property and repolish only this widget"""
+        widget.setProperty("recording", recording)
+        style = widget.style()
+        style.unpolish(widget)
+        style.polish(widget)
 
     def set_interval(self, interval_seconds: int):
         """Set capture interval"""
-        if interval_seconds < 60:
-            interval_text = f"{interval_seconds}秒"
-        else:
-            minutes = interval_seconds // 60
-            seconds = interval_seconds % 60
-            if seconds == 0:
-                interval_text = f"{minutes}分钟"
-            else:
-                interval_text = f"{minutes}分{seconds}秒"
+        if self.capture_interval == interval_seconds:
+            return
+
+        interval_text = _INTERVAL_TEXT.get(interval_seconds) or self._format_interval(interval_seconds)
 
         self.interval_label.setText(f"截图间隔: {interval_text}")
         self.capture_interval = interval_seconds
+        # Progress is measured in seconds so each tick is a plain subtraction
+        self.progress_bar.setRange(0, interval_seconds)
+
+    @staticmethod
+    def _format_interval(interval_seconds: int) -> str:
+        """Format a custom interval as seconds / minutes text"""
+        if interval_seconds < 60:
+            return f"{interval_seconds}秒"
+
+        minutes, seconds = divmod(interval_seconds, 60)
+        if seconds == 0:
+            return f"{minutes}分钟"
+        return f"{minutes}分{seconds}秒"
 
     def set_next_capture_time(self, next_time: datetime):
         """Set next capture time"""
@@ -152,46 +239,67 @@ class StatusWidget(QWidget):
 
     def update_last_activity(self, activity: str, timestamp: str = None):
         """Update the last activity display"""
-        if timestamp:
-            # Parse timestamp and format it
-            try:
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                time_str = dt.strftime("%H:%M:%S")
-                self.activity_text.setPlainText(f"[{time_str}] {activity}")
-            except:
-                self.activity_text.setPlainText(activity)
+        # Queued log lines would be replaced by this text anyway
+        self._log_queue.clear()
+
+        # ISO timestamps carry HH:MM:SS at a fixed offset, no parsing needed
+        if timestamp and len(timestamp) >= 19 and timestamp[10] in "T ":
+            self.activity_text.setPlainText(f"[{timestamp[11:19]}] {activity}")
         else:
             self.activity_text.setPlainText(activity)
 
     def update_display(self):
         """Update the display with current information"""
-        if self.is_recording and self.next_capture_time:
-            now = datetime.now()
-            if self.next_capture_time > now:
-                time_diff = (self.next_capture_time - now).total_seconds()
-                time_str = self.next_capture_time.strftime("%H:%M:%S")
-                self.next_capture_label.setText(f"下次截图: {time_str} (倒计时: {int(time_diff)}秒)")
-
-                # Update progress bar
-                if hasattr(self, 'capture_interval'):
-                    progress = ((self.capture_interval - time_diff) / self.capture_interval) * 100
-                    self.progress_bar.setValue(int(max(0, min(100, progress))))
-            else:
-                self.next_capture_label.setText("下次截图: 即将开始...")
-                self.progress_bar.setValue(100)
+        next_capture_time = self.next_capture_time
+        if not (self.is_recording and next_capture_time):
+            return
+
+        next_capture_label = self.next_capture_label
+        progress_bar = self.progress_bar
+
+        now = datetime.now()
+        if next_capture_time > now:
+            time_diff = (next_capture_time - now).total_seconds()
+            time_str = next_capture_time.strftime("%H:%M:%S")
+            next_capture_label.setText(f"下次截图: {time_str} (倒计时: {int(time_diff)}秒)")
+
+            # Update progress bar
+            remaining = max(0, int(time_diff))
+            progress_bar.setValue(self.capture_interval - remaining)
+        else:
+            next_capture_label.setText("下次截图: 即将开始...")
+            progress_bar.setValue(progress_bar.maximum())
 
     def add_log_message(self, message: str, level: str = "INFO"):
         """Add a log message to the status display"""
         timestamp = datetime.now().strftime("%H:%M:%S")
 
         # Color code by log level
-        color = "#666"
-        if level == "ERROR":
-            color = "#dc3545"
-        elif level == "WARNING":
-            color = "#ffc107"
-        elif level == "SUCCESS":
-            color = "#28a745"
-
-        # Update the activity text with latest message
-        self.activity_text.append(f'<span style="color: {color};">[{timestamp}] {message}</span>')
\ No newline at end of file
+        char_format = self._log_formats.get(level, self._default_log_format)
+
+        # Bursts of messages are written together by _flush_log
+        self._log_queue.append((f"[{timestamp}] {message}", char_format))
+        if not self._log_flush_timer.isActive():
+            self._log_flush_timer.start()
+
+    def _flush_log(self):
+        """Write all queued log messages in a single edit block"""
+        if not self._log_queue:
+            return
+
+        cursor = self.activity_text.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.beginEditBlock()
+        try:
+            is_empty = self.activity_text.document().isEmpty()
+            while self._log_queue:
+                text, char_format = self._log_queue.popleft()
+                if not is_empty:
+                    cursor.insertBlock()
+                cursor.insertText(text, char_format)
+                is_empty = False
+        finally:
+            cursor.endEditBlock()
+
+        scroll_bar = self.activity_text.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.maximum())
\ No newline at end of file
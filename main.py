@@ -8,19 +8,33 @@ Automatic Activity Recorder
     python main.py --single           # 只执行一次录制
     python main.py --stats            # 显示统计信息
     python main.py --export [file]    # 导出活动记录
+    python main.py --export --pretty  # 导出带缩进的活动记录
 """
 
-import argparse
 import asyncio
 import logging
 import sys
 from datetime import datetime
-from typing import Optional
+from types import SimpleNamespace
+from typing import List, Optional
 
 from workflow import ActivityRecorderWorkflow
 from config import Config
 from storage import ActivityStorage
 
+logger = logging.getLogger(__name__)
+
+_BANNER = """
+╔══════════════════════════════════════════════════════════════╗
+║                    自动活动记录器                              ║
+║                Automatic Activity Recorder                   ║
+║                                                              ║
+║  每3分钟自动截图并使用AI分析用户活动                            ║
+║  Automatically screenshot and analyze user activity every    ║
+║  3 minutes using AI                                          ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
 
 def setup_logging() -> None:
     """设置日志记录"""
@@ -36,17 +50,7 @@ def setup_logging() -> None:
 
 def print_banner() -> None:
     """打印应用程序横幅"""
-    banner = """
-╔══════════════════════════════════════════════════════════════╗
-║                    自动活动记录器                              ║
-║                Automatic Activity Recorder                   ║
-║                                                              ║
-║  每3分钟自动截图并使用AI分析用户活动                            ║
-║  Automatically screenshot and analyze user activity every    ║
-║  3 minutes using AI                                          ║
-╚══════════════════════════════════════════════════════════════╝
-"""
-    print(banner)
+    print(_BANNER)
 
 
 async def run_continuous_recording() -> None:
@@ -62,7 +66,7 @@ async def run_continuous_recording() -> None:
         print("\n🛑 用户停止录制")
         print("📊 感谢使用自动活动记录器！")
     except Exception as e:
-        logging.error(f"连续录制失败: {str(e)}")
+        logger.error("连续录制失败: %s", e)
         print(f"❌ 错误: {str(e)}")
 
 
@@ -75,56 +79,65 @@ async def run_single_recording() -> None:
         result = await workflow.run_single_cycle()
 
         if result.get("success", False):
-            print(f"✅ 录制成功!")
-            print(f"📄 活动描述: {result.get('activity_description', 'N/A')}")
-            print(f"📁 截图路径: {result.get('screenshot_path', 'N/A')}")
+            sys.stdout.write(
+                "✅ 录制成功!\n"
+                f"📄 活动描述: {result.get('activity_description', 'N/A')}\n"
+                f"📁 截图路径: {result.get('screenshot_path', 'N/A')}\n"
+            )
         else:
             print(f"❌ 录制失败: {result.get('error', '未知错误')}")
 
+        # 单次模式没有后台清理任务，录制后顺便清理旧截图和记录
+        await workflow.run_cleanup()
+
     except Exception as e:
-        logging.error(f"单次录制失败: {str(e)}")
+        logger.error("单次录制失败: %s", e)
         print(f"❌ 错误: {str(e)}")
 
 
 def show_statistics() -> None:
     """显示统计信息"""
-    print("📊 活动记录统计信息\n")
+    # 收集所有输出行，最后一次性写入 stdout
+    lines = ["📊 活动记录统计信息\n"]
 
     try:
         storage = ActivityStorage()
         stats = storage.get_activity_statistics()
 
         if "error" in stats:
-            print(f"❌ 获取统计信息失败: {stats['error']}")
+            lines.append(f"❌ 获取统计信息失败: {stats['error']}")
             return
 
-        print(f"📈 总记录数量: {stats['total_activities']}")
-        print(f"✅ 成功分析: {stats['successful_analyses']}")
-        print(f"❌ 分析失败: {stats['failed_analyses']}")
-        print(f"📊 成功率: {stats['success_rate']}%")
+        lines.append(f"📈 总记录数量: {stats['total_activities']}")
+        lines.append(f"✅ 成功分析: {stats['successful_analyses']}")
+        lines.append(f"❌ 分析失败: {stats['failed_analyses']}")
+        lines.append(f"📊 成功率: {stats['success_rate']}%")
 
         if stats['first_activity']:
-            print(f"🕐 首次记录: {stats['first_activity']}")
+            lines.append(f"🕐 首次记录: {stats['first_activity']}")
         if stats['last_activity']:
-            print(f"🕐 最近记录: {stats['last_activity']}")
+            lines.append(f"🕐 最近记录: {stats['last_activity']}")
 
         # 显示最近的活动
         recent_activities = storage.get_recent_activities(limit=5)
         if recent_activities:
-            print(f"\n📋 最近5次活动:")
+            lines.append("\n📋 最近5次活动:")
             for i, activity in enumerate(recent_activities, 1):
                 timestamp = activity.get('timestamp', 'N/A')[:19]  # Remove microseconds
                 description = activity.get('activity_description', 'N/A')
                 success_icon = "✅" if activity.get('analysis_successful') else "❌"
-                print(f"  {i}. [{timestamp}] {success_icon} {description}")
+                lines.append(f"  {i}. [{timestamp}] {success_icon} {description}")
 
     except Exception as e:
-        logging.error(f"显示统计信息失败: {str(e)}")
-        print(f"❌ 错误: {str(e)}")
+        logger.error("显示统计信息失败: %s", e)
+        lines.append(f"❌ 错误: {str(e)}")
 
+    finally:
+        sys.stdout.write("\n".join(lines) + "\n")
 
-def export_activities(output_file: Optional[str] = None) -> None:
-    """导出活动记录"""
+
+def export_activities(output_file: Optional[str] = None, pretty: bool = False) -> None:
+    """导出活动记录 (默认紧凑 JSON, pretty=True 时带缩进)"""
     if not output_file:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_file = f"activities_export_{timestamp}.json"
@@ -133,7 +146,7 @@ def export_activities(output_file: Optional[str] = None) -> None:
 
     try:
         storage = ActivityStorage()
-        success = storage.export_activities(output_file)
+        success = storage.export_activities(output_file, pretty=pretty)
 
         if success:
             print(f"✅ 导出成功: {output_file}")
@@ -141,7 +154,7 @@ def export_activities(output_file: Optional[str] = None) -> None:
             print("❌ 导出失败")
 
     except Exception as e:
-        logging.error(f"导出活动记录失败: {str(e)}")
+        logger.error("导出活动记录失败: %s", e)
         print(f"❌ 错误: {str(e)}")
 
 
@@ -161,47 +174,123 @@ def validate_configuration() -> bool:
         return False
 
 
-async def main() -> None:
-    """主函数"""
-    parser = argparse.ArgumentParser(
-        description="自动截图活动记录器",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
+_USAGE = """用法: main.py [-h] [--single] [--stats] [--export [EXPORT]] [--pretty]
+               [--log-level {DEBUG,INFO,WARNING,ERROR}]
+"""
+
+_HELP = _USAGE + """
+自动截图活动记录器
+
+选项:
+  -h, --help            显示帮助信息并退出
+  --single              执行单次录制而不是连续录制
+  --stats               显示活动记录统计信息
+  --export [EXPORT]     导出活动记录到文件
+  --pretty              导出时使用带缩进的 JSON (便于人工查看)
+  --log-level {DEBUG,INFO,WARNING,ERROR}
+                        设置日志级别
+
 使用示例:
   python main.py                    # 开始连续录制
   python main.py --single           # 只执行一次录制
   python main.py --stats            # 显示统计信息
   python main.py --export output.json  # 导出到指定文件
-        """
-    )
+  python main.py --export --pretty  # 导出带缩进的 JSON
+"""
 
-    parser.add_argument(
-        "--single",
-        action="store_true",
-        help="执行单次录制而不是连续录制"
-    )
+_LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+
+def _usage_error(message: str) -> None:
+    """打印用法错误并退出"""
+    sys.stderr.write(f"{_USAGE}main.py: error: {message}\n")
+    sys.exit(2)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> SimpleNamespace:
+    """解析命令行参数
+
+    只有五个选项，手动解析即可，避免 argparse 的导入和构建开销。
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    args = SimpleNamespace(single=False, stats=False, export=None, pretty=False, log_level="INFO")
+
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        option, has_value, value = arg.partition("=")
+
+        if arg in ("-h", "--help"):
+            sys.stdout.write(_HELP)
+            sys.exit(0)
+        elif arg == "--single":
+            args.single = True
+        elif arg == "--stats":
+            args.stats = True
+        elif arg == "--pretty":
+            args.pretty = True
+        elif option == "--export":
+            # 文件名可选；省略时导出到默认文件名
+            if has_value:
+                args.export = value
+            elif i + 1 < len(argv) and not argv[i + 1].startswith("-"):
+                i += 1
+                args.export = argv[i]
+            else:
+                args.export = ""
+        elif option == "--log-level":
+            if not has_value:
+                if i + 1 >= len(argv):
+                    _usage_error("argument --log-level: expected one argument")
+                i += 1
+                value = argv[i]
+            if value not in _LOG_LEVELS:
+                _usage_error(
+                    f"argument --log-level: invalid choice: '{value}' "
+                    f"(choose from {', '.join(_LOG_LEVELS)})"
+                )
+            args.log_level = value
+        else:
+            _usage_error(f"unrecognized arguments: {arg}")
 
-    parser.add_argument(
-        "--stats",
-        action="store_true",
-        help="显示活动记录统计信息"
-    )
+        i += 1
 
-    parser.add_argument(
-        "--export",
-        nargs="?",
-        const=None,
-        help="导出活动记录到文件"
-    )
+    return args
 
-    parser.add_argument(
-        "--log-level",
-        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
-        default="INFO",
-        help="设置日志级别"
-    )
 
-    args = parser.parse_args()
+def _dispatch(args: SimpleNamespace) -> None:
+    """执行同步子命令 (--stats / --export)"""
+    try:
+        if args.stats:
+            show_statistics()
+        else:
+            export_activities(args.export, pretty=args.pretty)
+
+    except Exception as e:
+        logger.error("程序执行失败: %s", e)
+        print(f"❌ 程序执行失败: {str(e)}")
+        sys.exit(1)
+
+
+async def _dispatch_async(args: SimpleNamespace) -> None:
+    """执行异步录制子命令 (--single / 连续录制)"""
+    try:
+        if args.single:
+            await run_single_recording()
+        else:
+            await run_continuous_recording()
+
+    except Exception as e:
+        logger.error("程序执行失败: %s", e)
+        print(f"❌ 程序执行失败: {str(e)}")
+        sys.exit(1)
+
+
+def main() -> None:
+    """主函数"""
+    args = parse_args()
 
     # 设置日志
     setup_logging()
@@ -214,29 +303,20 @@ async def main() -> None:
     if not validate_configuration():
         sys.exit(1)
 
-    try:
-        if args.stats:
-            show_statistics()
-        elif args.export is not None:
-            export_activities(args.export)
-        elif args.single:
-            await run_single_recording()
-        else:
-            await run_continuous_recording()
-
-    except Exception as e:
-        logging.error(f"程序执行失败: {str(e)}")
-        print(f"❌ 程序执行失败: {str(e)}")
-        sys.exit(1)
+    # 统计和导出是纯同步操作，无需启动事件循环
+    if args.stats or args.export is not None:
+        _dispatch(args)
+    else:
+        asyncio.run(_dispatch_async(args))
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        main()
     except KeyboardInterrupt:
         print("\n🛑 程序被用户中断")
         sys.exit(0)
     except Exception as e:
-        logging.error(f"程序启动失败: {str(e)}")
+        logger.error("程序启动失败: %s", e)
         print(f"❌ 程序启动失败: {str(e)}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -11,11 +11,36 @@ GUI Entry Point for Auto Activity Recorder
 import sys
 import os
 import logging
+import importlib.util
 from pathlib import Path
 
 # Add the gui module to the Python path
 sys.path.insert(0, str(Path(__file__).parent))
 
+logger = logging.getLogger(__name__)
+
+_WELCOME_MSG = """
+╔══════════════════════════════════════════════════════════════╗
+║                    自动活动记录器 GUI 版                        ║
+║                Auto Activity Recorder - GUI Version         ║
+║                                                              ║
+║  🖥️  图形界面操作，更加直观便捷                                ║
+║  ⚙️  可视化设置管理                                             ║
+║  📊  智能时间查询分析                                           ║
+║  📸  截图预览和管理                                             ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+# (module name, package name to install)
+REQUIRED_MODULES = (
+    ("PyQt6", "PyQt6"),
+    ("dashscope", "dashscope"),
+    ("mss", "mss"),
+    ("orjson", "orjson"),
+    ("PIL", "pillow"),
+    ("langgraph", "langgraph"),
+)
+
 def setup_logging():
     """Setup logging for GUI application"""
     logging.basicConfig(
@@ -31,30 +56,10 @@ def check_dependencies():
     """Check if required GUI dependencies are available"""
     missing_deps = []
 
-    try:
-        import PyQt6
-    except ImportError:
-        missing_deps.append("PyQt6")
-
-    try:
-        import dashscope
-    except ImportError:
-        missing_deps.append("dashscope")
-
-    try:
-        import mss
-    except ImportError:
-        missing_deps.append("mss")
-
-    try:
-        from PIL import Image
-    except ImportError:
-        missing_deps.append("pillow")
-
-    try:
-        import langgraph
-    except ImportError:
-        missing_deps.append("langgraph")
+    # find_spec only locates the modules; the real imports happen later
+    for module_name, package_name in REQUIRED_MODULES:
+        if importlib.util.find_spec(module_name) is None:
+            missing_deps.append(package_name)
 
     if missing_deps:
         print("❌ 缺少必要的依赖库:")
@@ -82,18 +87,7 @@ def check_display_environment():
 
 def show_welcome():
     """Show welcome message"""
-    welcome_msg = """
-╔══════════════════════════════════════════════════════════════╗
-║                    自动活动记录器 GUI 版                        ║
-║                Auto Activity Recorder - GUI Version         ║
-║                                                              ║
-║  🖥️  图形界面操作，更加直观便捷                                ║
-║  ⚙️  可视化设置管理                                             ║
-║  📊  智能时间查询分析                                           ║
-║  📸  截图预览和管理                                             ║
-╚══════════════════════════════════════════════════════════════╝
-"""
-    print(welcome_msg)
+    print(_WELCOME_MSG)
 
 def main():
     """Main entry point"""
@@ -121,13 +115,13 @@ def main():
         gui_main()
 
     except ImportError as e:
-        logging.error(f"导入GUI模块失败: {str(e)}")
+        logger.error("导入GUI模块失败: %s", e)
         print(f"❌ GUI模块导入失败: {str(e)}")
         print("请确保所有依赖都已正确安装")
         sys.exit(1)
 
     except Exception as e:
-        logging.error(f"GUI启动失败: {str(e)}")
+        logger.error("GUI启动失败: %s", e)
         print(f"❌ GUI启动失败: {str(e)}")
 
         # Show error dialog if possible
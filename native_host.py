@@ -13,12 +13,12 @@ Protocol:
 """
 
 import sys
-import json
 import struct
 import logging
 import asyncio
 import threading
-from typing import Dict, Any, Optional
+import orjson
+from typing import Dict, Any, Callable, Optional, Set
 from pathlib import Path
 
 # Import existing modules
@@ -52,51 +52,126 @@ class NativeMessagingHost:
         # Recording state
         self.is_recording = False
         self.recording_task: Optional[asyncio.Task] = None
-        self.event_loop: Optional[asyncio.AbstractEventLoop] = None
-        self.loop_thread: Optional[threading.Thread] = None
+
+        # Framed stdin stream, opened once the event loop is running
+        self._reader: Optional[asyncio.StreamReader] = None
+
+        # In-flight message tasks, kept referenced until they finish
+        self._message_tasks: Set[asyncio.Task] = set()
+
+        # Binary stdout used for framed responses
+        self._out = sys.stdout.buffer
+
+        # Command dispatch table; handlers may return a response or a coroutine
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            'start_recording': self._handle_start_recording,
+            'stop_recording': lambda message: self._handle_stop_recording(),
+            'capture_now': self._handle_capture_now,
+            'get_activities': self._handle_get_activities,
+            'query_time_range': self._handle_query_time_range,
+            'get_status': lambda message: self._handle_get_status(),
+            'update_settings': self._handle_update_settings,
+            'get_statistics': lambda message: self._handle_get_statistics(),
+        }
 
     def start(self):
         """Start the native messaging host"""
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            logger.info("Received keyboard interrupt")
+        except Exception as e:
+            logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+
+    async def _serve(self):
+        """Read, process and answer messages on the main-thread event loop"""
         logger.info("Native messaging host started")
 
-        # Start event loop in separate thread for async operations
-        self._start_event_loop()
+        self._reader = await self._open_stdin_reader()
+
+        # Old screenshots and activities are cleaned up in the background for
+        # the host's whole lifetime, since captures also arrive via capture_now
+        cleanup_task = asyncio.create_task(self.workflow.run_periodic_cleanup())
 
         try:
             while True:
                 # Read message from stdin
-                message = self._read_message()
+                message = await self._read_message()
                 if message is None:
                     break
 
-                # Process message and get response
-                response = self._process_message(message)
+                # Handle each message in its own task so the next one is read
+                # (and quick queries answered) while e.g. a capture is running
+                task = asyncio.create_task(self._handle_message(message))
+                self._message_tasks.add(task)
+                task.add_done_callback(self._message_tasks.discard)
 
-                # Send response to stdout
-                self._send_message(response)
+            # Let in-flight commands (and captures they started) send their
+            # responses before exiting
+            while self._message_tasks:
+                await asyncio.gather(*self._message_tasks, return_exceptions=True)
 
-        except KeyboardInterrupt:
-            logger.info("Received keyboard interrupt")
-        except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         finally:
+            cleanup_task.cancel()
             self._cleanup()
 
-    def _start_event_loop(self):
-        """Start asyncio event loop in a separate thread"""
-        def run_loop():
-            self.event_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self.event_loop)
-            self.event_loop.run_forever()
+    async def _handle_message(self, message: Dict[str, Any]):
+        """Process one message and send its response"""
+        # Process message and get response
+        response = await self._process_message(message)
+
+        # Send response to stdout; each frame goes out in a single write, so
+        # concurrent responses never interleave
+        self._send_message(response)
+
+    async def _open_stdin_reader(self) -> asyncio.StreamReader:
+        """Attach stdin to the running event loop as a StreamReader"""
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+
+        if sys.platform == "win32":
+            # The browser's stdin pipe can't be registered with the Proactor
+            # loop, so a daemon thread pumps it into the reader instead
+            threading.Thread(
+                target=self._pump_stdin, args=(loop, reader), daemon=True
+            ).start()
+        else:
+            await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+            )
+
+        return reader
 
-        self.loop_thread = threading.Thread(target=run_loop, daemon=True)
-        self.loop_thread.start()
+    @staticmethod
+    def _pump_stdin(loop: asyncio.AbstractEventLoop, reader: asyncio.StreamReader):
+        """Feed raw stdin chunks into reader from a background thread"""
+        stdin = sys.stdin.buffer
 
-        # Wait for loop to be ready
-        while self.event_loop is None:
-            pass
+        # One preallocated buffer is reused for every chunk; the pump waits
+        # until the loop has copied a chunk into the reader before refilling it
+        view = memoryview(bytearray(65536))
+        fed = threading.Event()
+
+        def feed(chunk: memoryview):
+            try:
+                reader.feed_data(chunk)
+            finally:
+                fed.set()
 
-    def _read_message(self) -> Optional[Dict[str, Any]]:
+        try:
+            while True:
+                n = stdin.readinto1(view)
+                if not n:
+                    break
+                fed.clear()
+                loop.call_soon_threadsafe(feed, view[:n])
+                fed.wait()
+        except Exception as e:
+            logger.error(f"Failed to read stdin: {str(e)}")
+        finally:
+            loop.call_soon_threadsafe(reader.feed_eof)
+
+    async def _read_message(self) -> Optional[Dict[str, Any]]:
         """
         Read a message from stdin using native messaging protocol
 
@@ -105,25 +180,29 @@ class NativeMessagingHost:
         """
         try:
             # Read the message length (first 4 bytes)
-            raw_length = sys.stdin.buffer.read(4)
-
-            if len(raw_length) == 0:
+            try:
+                raw_length = await self._reader.readexactly(4)
+            except asyncio.IncompleteReadError:
                 logger.info("Stdin closed, exiting")
                 return None
 
             # Decode message length (little-endian uint32)
-            message_length = struct.unpack('=I', raw_length)[0]
+            message_length = struct.unpack_from('<I', raw_length, 0)[0]
 
             # Read the message content
-            message_bytes = sys.stdin.buffer.read(message_length)
+            try:
+                message_bytes = await self._reader.readexactly(message_length)
+            except asyncio.IncompleteReadError:
+                logger.warning("Stdin closed in the middle of a message, exiting")
+                return None
 
             # Decode JSON
-            message = json.loads(message_bytes.decode('utf-8'))
+            message = orjson.loads(message_bytes)
             logger.info(f"Received message: {message.get('command', 'unknown')}")
 
             return message
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to decode message: {str(e)}")
             return {"command": "error", "error": "Invalid JSON"}
         except Exception as e:
@@ -138,23 +217,19 @@ class NativeMessagingHost:
             message: Dict to send as JSON
         """
         try:
-            # Encode message as JSON
-            message_json = json.dumps(message)
-            message_bytes = message_json.encode('utf-8')
-
-            # Write message length (4 bytes, little-endian uint32)
-            sys.stdout.buffer.write(struct.pack('=I', len(message_bytes)))
+            # Encode message as JSON (orjson produces UTF-8 bytes directly)
+            message_bytes = orjson.dumps(message)
 
-            # Write message content
-            sys.stdout.buffer.write(message_bytes)
-            sys.stdout.buffer.flush()
+            # Length header (4 bytes, little-endian uint32) and content in one write
+            self._out.write(struct.pack('<I', len(message_bytes)) + message_bytes)
+            self._out.flush()
 
             logger.info(f"Sent message: {message.get('command', 'unknown')}")
 
         except Exception as e:
             logger.error(f"Failed to send message: {str(e)}")
 
-    def _process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def _process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """
         Process a message from the browser extension
 
@@ -166,29 +241,19 @@ class NativeMessagingHost:
         """
         command = message.get('command')
 
+        handler = self._handlers.get(command)
+        if handler is None:
+            return {
+                "command": command,
+                "success": False,
+                "error": f"Unknown command: {command}"
+            }
+
         try:
-            if command == 'start_recording':
-                return self._handle_start_recording(message)
-            elif command == 'stop_recording':
-                return self._handle_stop_recording()
-            elif command == 'capture_now':
-                return self._handle_capture_now()
-            elif command == 'get_activities':
-                return self._handle_get_activities(message)
-            elif command == 'query_time_range':
-                return self._handle_query_time_range(message)
-            elif command == 'get_status':
-                return self._handle_get_status()
-            elif command == 'update_settings':
-                return self._handle_update_settings(message)
-            elif command == 'get_statistics':
-                return self._handle_get_statistics()
-            else:
-                return {
-                    "command": command,
-                    "success": False,
-                    "error": f"Unknown command: {command}"
-                }
+            response = handler(message)
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
 
         except Exception as e:
             logger.error(f"Error processing command {command}: {str(e)}", exc_info=True)
@@ -214,12 +279,14 @@ class NativeMessagingHost:
         if interval != self.config.get_screenshot_interval():
             Config.SCREENSHOT_INTERVAL = interval
 
-        # Start recording in event loop
+        # Start recording as a task on the host's event loop
         async def start_continuous_recording():
             try:
-                self.is_recording = True
                 logger.info(f"Starting continuous recording with interval: {interval}s")
 
+                loop = asyncio.get_running_loop()
+                next_deadline = loop.time()
+
                 while self.is_recording:
                     # Run single cycle
                     result = await self.workflow.run_single_cycle()
@@ -229,8 +296,14 @@ class NativeMessagingHost:
                     else:
                         logger.error(f"Cycle failed: {result.get('error', 'Unknown')}")
 
-                    # Wait for next cycle
-                    await asyncio.sleep(interval)
+                    # Wait for the next fixed deadline so the cadence doesn't drift by
+                    # the cycle duration; after an overrun, skip the missed slots
+                    # instead of running cycles back to back
+                    next_deadline += interval
+                    now = loop.time()
+                    if interval > 0 and next_deadline < now:
+                        next_deadline += ((now - next_deadline) // interval + 1) * interval
+                    await asyncio.sleep(max(0, next_deadline - now))
 
             except asyncio.CancelledError:
                 logger.info("Recording cancelled")
@@ -239,12 +312,9 @@ class NativeMessagingHost:
                 logger.error(f"Recording error: {str(e)}", exc_info=True)
                 self.is_recording = False
 
-        # Schedule task in event loop
-        future = asyncio.run_coroutine_threadsafe(
-            start_continuous_recording(),
-            self.event_loop
-        )
-        self.recording_task = future
+        # Mark as recording before the task first runs so a quick stop is honoured
+        self.is_recording = True
+        self.recording_task = asyncio.create_task(start_continuous_recording())
 
         return {
             "command": "start_recording",
@@ -279,20 +349,39 @@ class NativeMessagingHost:
             "message": "Recording stopped"
         }
 
-    def _handle_capture_now(self) -> Dict[str, Any]:
-        """Handle capture_now command - trigger immediate screenshot"""
-        async def capture():
-            return await self.workflow.run_single_cycle()
+    def _handle_capture_now(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Handle capture_now command - trigger immediate screenshot
 
-        # Run capture in event loop and wait for result
-        future = asyncio.run_coroutine_threadsafe(capture(), self.event_loop)
+        The capture runs in the background; this returns an "accepted" ack
+        right away and the outcome follows as a separate capture_now.result
+        message carrying the same id.
+        """
+        request_id = message.get('id')
 
+        task = asyncio.create_task(self._capture_and_send(request_id))
+        self._message_tasks.add(task)
+        task.add_done_callback(self._message_tasks.discard)
+
+        return {
+            "command": "capture_now",
+            "success": True,
+            "status": "accepted",
+            "id": request_id
+        }
+
+    async def _capture_and_send(self, request_id: Any):
+        """Run a capture cycle and send its outcome as a capture_now.result message"""
         try:
-            result = future.result(timeout=30)  # 30 second timeout
+            result = await asyncio.wait_for(
+                self.workflow.run_single_cycle(),
+                timeout=30  # 30 second timeout
+            )
 
             if result.get("success", False):
-                return {
-                    "command": "capture_now",
+                response = {
+                    "command": "capture_now.result",
+                    "id": request_id,
                     "success": True,
                     "activity": {
                         "timestamp": result.get("timestamp"),
@@ -301,25 +390,30 @@ class NativeMessagingHost:
                     }
                 }
             else:
-                return {
-                    "command": "capture_now",
+                response = {
+                    "command": "capture_now.result",
+                    "id": request_id,
                     "success": False,
                     "error": result.get("error", "Capture failed")
                 }
 
         except asyncio.TimeoutError:
-            return {
-                "command": "capture_now",
+            response = {
+                "command": "capture_now.result",
+                "id": request_id,
                 "success": False,
                 "error": "Capture timeout"
             }
         except Exception as e:
-            return {
-                "command": "capture_now",
+            response = {
+                "command": "capture_now.result",
+                "id": request_id,
                 "success": False,
                 "error": str(e)
             }
 
+        self._send_message(response)
+
     def _handle_get_activities(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle get_activities command"""
         limit = message.get('limit', 10)
@@ -337,7 +431,7 @@ class NativeMessagingHost:
             "count": len(activities)
         }
 
-    def _handle_query_time_range(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_query_time_range(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle query_time_range command - AI-powered time range analysis"""
         start_time = message.get('start_time')
         end_time = message.get('end_time')
@@ -351,13 +445,7 @@ class NativeMessagingHost:
             }
 
         # Get activities in time range
-        data = self.storage._load_data()
-        activities = data.get("activities", [])
-
-        filtered_activities = [
-            activity for activity in activities
-            if start_time <= activity["timestamp"] <= end_time
-        ]
+        filtered_activities = self.storage.get_activities_in_range(start_time, end_time)
 
         if not filtered_activities:
             return {
@@ -384,8 +472,7 @@ class NativeMessagingHost:
                 # to support text-only queries or use a different model
                 return {"summary": f"分析了 {len(filtered_activities)} 条活动记录"}
 
-            future = asyncio.run_coroutine_threadsafe(query_ai(), self.event_loop)
-            result = future.result(timeout=30)
+            result = await asyncio.wait_for(query_ai(), timeout=30)
 
             return {
                 "command": "query_time_range",
@@ -467,15 +554,21 @@ class NativeMessagingHost:
         """Cleanup resources before exit"""
         logger.info("Cleaning up...")
 
-        # Stop recording if running
+        # Stop recording if running (asyncio.run cancels the task's remaining work)
         if self.is_recording:
             self.is_recording = False
             if self.recording_task:
                 self.recording_task.cancel()
 
-        # Stop event loop
-        if self.event_loop:
-            self.event_loop.call_soon_threadsafe(self.event_loop.stop)
+        # Write out activities still buffered by the recording workflow
+        try:
+            self.workflow.storage.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush activity log: {str(e)}")
+
+        # Release the pooled model API connections
+        self.workflow.analysis_agent.close()
+        self.analysis_agent.close()
 
         logger.info("Native messaging host stopped")
 
@@ -1,10 +1,15 @@
 import os
 import io
 import base64
-from datetime import datetime
-from typing import Optional, Tuple
-from mss import mss
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import numpy as np
 from PIL import Image
+from mss import mss
+from mss.tools import to_png
 from config import Config
 
 class ScreenshotAgent:
@@ -14,68 +19,226 @@ class ScreenshotAgent:
         self.screenshot_dir = Config.SCREENSHOT_DIR
         self._ensure_screenshot_dir()
 
+        # mss handles are thread-affine, so each capturing thread keeps its own
+        self._local = threading.local()
+        self._grabbers = []
+        self._grabbers_lock = threading.Lock()
+
+        # Small dedicated pool for async captures; also bounds the mss instances
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="screenshot")
+
     def _ensure_screenshot_dir(self) -> None:
         """Create screenshots directory if it doesn't exist"""
         if not os.path.exists(self.screenshot_dir):
             os.makedirs(self.screenshot_dir)
 
-    def capture_screenshot(self) -> Tuple[str, str]:
+    def _get_grabber(self):
+        """Return this thread's mss instance and primary monitor, creating them on first use"""
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = mss()
+            self._local.sct = sct
+            self._local.monitor = sct.monitors[1]
+            with self._grabbers_lock:
+                self._grabbers.append(sct)
+        return sct, self._local.monitor
+
+    def _discard_grabber(self) -> None:
+        """Drop this thread's mss instance so the next capture starts fresh"""
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            return
+        self._local.sct = None
+        with self._grabbers_lock:
+            if sct in self._grabbers:
+                self._grabbers.remove(sct)
+        try:
+            sct.close()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        """Release the capture threads and all mss instances held by this agent"""
+        self._executor.shutdown(wait=False)
+        with self._grabbers_lock:
+            grabbers, self._grabbers = self._grabbers, []
+        for sct in grabbers:
+            try:
+                sct.close()
+            except Exception:
+                pass
+
+    def __del__(self):
+        # __init__ may have failed before the executor existed
+        if hasattr(self, "_executor"):
+            self.close()
+
+    @staticmethod
+    def compute_dhash(rgb: bytes, size: Tuple[int, int]) -> int:
+        """
+        Compute a 64-bit difference hash (dHash) of raw RGB pixels
+
+        The image is reduced to a 9x8 grayscale grid and each bit records
+        whether a cell is brighter than its left neighbour, so near-identical
+        frames get hashes that differ in only a few bits.
+
+        Args:
+            rgb (bytes): Packed RGB pixel data
+            size (Tuple[int, int]): (width, height) of the image
+
+        Returns:
+            int: 64-bit hash
         """
-        Capture a screenshot and return both file path and base64 encoded image
+        width, height = size
+        pixels = np.frombuffer(rgb, dtype=np.uint8).reshape(height, width, 3)
+
+        # A 9x8 grid doesn't need every pixel; subsample before averaging
+        if height >= 32 and width >= 36:
+            pixels = pixels[::4, ::4]
+
+        gray = pixels @ np.array([299, 587, 114], dtype=np.uint32)
+
+        # Average into 8 rows x 9 columns of equal-sized blocks
+        rows, cols = gray.shape[0] // 8, gray.shape[1] // 9
+        grid = gray[:rows * 8, :cols * 9].reshape(8, rows, 9, cols).mean(axis=(1, 3))
+
+        bits = grid[:, 1:] > grid[:, :-1]
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+    @staticmethod
+    def encode_for_upload(image: Image.Image) -> str:
+        """
+        Encode an image as the base64 JPEG payload sent for analysis
+
+        The image is shrunk so its longest side fits Config.UPLOAD_MAX_EDGE;
+        a JPEG is several times smaller than the PNG kept on disk.
+
+        Args:
+            image (Image.Image): Screenshot image
 
         Returns:
-            Tuple[str, str]: (file_path, base64_image)
+            str: Base64 encoded JPEG
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"screenshot_{timestamp}.png"
-        filepath = os.path.join(self.screenshot_dir, filename)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((Config.UPLOAD_MAX_EDGE, Config.UPLOAD_MAX_EDGE))
+
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=Config.UPLOAD_JPEG_QUALITY, optimize=True)
+        return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    @classmethod
+    def load_for_upload(cls, file_path: str) -> str:
+        """
+        Read a saved screenshot and encode it as the base64 JPEG payload
+
+        Args:
+            file_path (str): Path of the screenshot file
+
+        Returns:
+            str: Base64 encoded JPEG
+        """
+        with Image.open(file_path) as image:
+            return cls.encode_for_upload(image)
+
+    def capture_screenshot(self) -> Tuple[str, str, int]:
+        """
+        Capture a screenshot and return its file path, base64 encoded image and dHash
+
+        The PNG is saved at full resolution; the base64 image is the smaller
+        JPEG produced by encode_for_upload.
+
+        Returns:
+            Tuple[str, str, int]: (file_path, base64_jpeg, dhash)
+        """
+        captured_at = datetime.now()
 
         try:
-            with mss() as sct:
-                # Capture entire screen (monitor 1)
-                monitor = sct.monitors[1]
+            # Capture entire screen (monitor 1) with the reusable mss instance
+            sct, monitor = self._get_grabber()
+            try:
                 screenshot = sct.grab(monitor)
+            except Exception:
+                # The display may have changed; reconnect on the next capture
+                self._discard_grabber()
+                raise
+
+            # Encode the raw pixels straight to PNG for the file on disk;
+            # level=1 trades a little file size for much faster deflate.
+            png_bytes = to_png(screenshot.rgb, screenshot.size, level=1)
 
-                # Convert to PIL Image
-                img = Image.frombytes("RGB", screenshot.size, screenshot.bgra, "raw", "BGRX")
+            # Save to file. Concurrent captures can share a timestamp, so the
+            # name carries microseconds and "x" mode never overwrites: on a
+            # clash the capture takes the next free microsecond instead
+            while True:
+                filepath = os.path.join(
+                    self.screenshot_dir, f"screenshot_{captured_at:%Y%m%d_%H%M%S_%f}.png"
+                )
+                try:
+                    with open(filepath, "xb") as f:
+                        f.write(png_bytes)
+                    break
+                except FileExistsError:
+                    captured_at += timedelta(microseconds=1)
 
-                # Save to file
-                img.save(filepath, "PNG")
+            # The API gets a downscaled JPEG instead of the full PNG
+            img_base64 = self.encode_for_upload(
+                Image.frombytes("RGB", screenshot.size, screenshot.rgb)
+            )
 
-                # Convert to base64 for API usage
-                buffer = io.BytesIO()
-                img.save(buffer, format="PNG")
-                img_base64 = base64.b64encode(buffer.getvalue()).decode()
+            # Perceptual hash so callers can spot unchanged screens cheaply
+            dhash = self.compute_dhash(screenshot.rgb, screenshot.size)
 
-                return filepath, img_base64
+            return filepath, img_base64, dhash
 
         except Exception as e:
             raise Exception(f"Failed to capture screenshot: {str(e)}")
 
+    async def capture_screenshot_async(self) -> Tuple[str, str, int]:
+        """
+        Capture a screenshot on a worker thread without blocking the event loop
+
+        Returns:
+            Tuple[str, str, int]: (file_path, base64_image, dhash)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.capture_screenshot)
+
+    def _list_screenshots(self) -> List[str]:
+        """
+        List screenshot filenames in the screenshot directory
+
+        Names follow screenshot_YYYYMMDD_HHMMSS_ffffff.png (older ones lack the
+        microseconds and still sort first within their second), so lexicographic
+        order is chronological and no per-file stat is needed to find the newest ones.
+        """
+        with os.scandir(self.screenshot_dir) as entries:
+            return [
+                entry.name for entry in entries
+                if entry.name.startswith('screenshot_') and entry.name.endswith('.png')
+            ]
+
     def get_latest_screenshot(self) -> Optional[Tuple[str, str]]:
         """
         Get the most recent screenshot
 
         Returns:
-            Optional[Tuple[str, str]]: (file_path, base64_image) or None if no screenshots exist
+            Optional[Tuple[str, str]]: (file_path, base64_jpeg) or None if no screenshots exist
         """
         if not os.path.exists(self.screenshot_dir):
             return None
 
-        screenshot_files = [f for f in os.listdir(self.screenshot_dir) if f.endswith('.png')]
+        screenshot_files = self._list_screenshots()
         if not screenshot_files:
             return None
 
-        latest_file = max(screenshot_files, key=lambda f: os.path.getctime(os.path.join(self.screenshot_dir, f)))
+        latest_file = max(screenshot_files)
         latest_path = os.path.join(self.screenshot_dir, latest_file)
 
-        # Convert to base64
+        # Convert to the same base64 JPEG payload a fresh capture produces
         try:
-            with Image.open(latest_path) as img:
-                buffer = io.BytesIO()
-                img.save(buffer, format="PNG")
-                img_base64 = base64.b64encode(buffer.getvalue()).decode()
-                return latest_path, img_base64
+            img_base64 = self.load_for_upload(latest_path)
+            return latest_path, img_base64
         except Exception as e:
             raise Exception(f"Failed to process latest screenshot: {str(e)}")
 
@@ -89,12 +252,12 @@ class ScreenshotAgent:
         if not os.path.exists(self.screenshot_dir):
             return
 
-        screenshot_files = [f for f in os.listdir(self.screenshot_dir) if f.endswith('.png')]
+        screenshot_files = self._list_screenshots()
         if len(screenshot_files) <= keep_last_n:
             return
 
-        # Sort by creation time and remove oldest files
-        screenshot_files.sort(key=lambda f: os.path.getctime(os.path.join(self.screenshot_dir, f)))
+        # Sort by the timestamp in the filename and remove oldest files
+        screenshot_files.sort()
         files_to_remove = screenshot_files[:-keep_last_n]
 
         for file_to_remove in files_to_remove:
@@ -1,40 +1,242 @@
-import json
 import os
+import time
+import atexit
+import threading
+import bisect
+import weakref
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 from config import Config
 import logging
+import numpy as np
+import orjson
+
+# Live storages, flushed at exit; weak so a discarded storage (and its cache) can be freed
+_open_storages = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_storages() -> None:
+    """Write out records still buffered by any storage when the process exits"""
+    for storage in list(_open_storages):
+        try:
+            storage.flush()
+        except Exception:
+            pass  # flush() already logged it
+
 
 class ActivityStorage:
-    """Handles storage and retrieval of activity records"""
+    """Handles storage and retrieval of activity records
+
+    Activities are stored as JSON Lines: one compact JSON record per line,
+    appended in chronological order. New records are buffered and appended
+    in batches; call flush() to write them out immediately. Nothing flushes
+    on a timer, so a writer that saves a burst of records should flush()
+    once the burst is done.
+    """
 
     def __init__(self):
         self.log_file = Config.ACTIVITY_LOG_FILE
+
+        # Parsed activities, reused until the log file's signature changes
+        self._cache: Optional[List[Dict[str, Any]]] = None
+        self._cache_signature: Optional[Tuple[int, int]] = None
+
+        # Per-day index derived from the cached activities
+        self._date_index: Dict[str, List[Dict[str, Any]]] = {}
+        self._date_index_signature: Optional[Tuple[int, int]] = None
+
+        # Cached activities' timestamps in sorted order, used to bisect range
+        # queries, and the activity index of each one; the order is None while
+        # the log is already in timestamp order (the usual case)
+        self._timestamps: List[str] = []
+        self._timestamp_order: Optional[List[int]] = None
+        self._timestamps_signature: Optional[Tuple[int, int]] = None
+
+        # Epoch nanoseconds parallel to the cached activities, for vectorized age checks
+        self._ts_ns = np.empty(0, dtype=np.int64)
+        self._ts_ns_signature: Optional[Tuple[int, int]] = None
+
+        # Guards the buffer, the cache and its indexes: the workflow saves and
+        # cleans up on worker threads while the event loop reads statistics.
+        # Reentrant because the index getters load (and flush) under it too
+        self._lock = threading.RLock()
+
+        # Saved activities not yet appended to the log file; a record saved
+        # long after the previous write is written straight away, so only
+        # bursts of saves are actually held back
+        self._pending: deque = deque()
+        self._last_flush = float('-inf')
+
+        self._migrate_legacy_log()
         self._ensure_log_file()
 
+        # Don't lose buffered records when the process exits
+        _open_storages.add(self)
+
     def _ensure_log_file(self) -> None:
         """Create activity log file if it doesn't exist"""
         if not os.path.exists(self.log_file):
-            initial_data = {
-                "created_at": datetime.now().isoformat(),
-                "activities": []
-            }
-            self._save_data(initial_data)
+            open(self.log_file, 'a', encoding='utf-8').close()
+
+    def _migrate_legacy_log(self) -> None:
+        """Convert the old whole-file JSON log to JSON Lines (one-shot)"""
+        legacy_file = Config.LEGACY_ACTIVITY_LOG_FILE
+        if os.path.exists(self.log_file) or not os.path.exists(legacy_file):
+            return
+
+        try:
+            with open(legacy_file, 'rb') as f:
+                activities = orjson.loads(f.read()).get("activities", [])
+
+            self._write_activities(activities)
+            logging.info(f"Migrated {len(activities)} activities from {legacy_file} to {self.log_file}")
+
+        except Exception as e:
+            logging.error(f"Failed to migrate legacy activity log: {str(e)}")
 
-    def _load_data(self) -> Dict[str, Any]:
-        """Load data from the activity log file"""
+    def _iter_activities(self) -> Iterator[Dict[str, Any]]:
+        """Stream activity records from the log file, oldest first"""
         try:
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            with open(self.log_file, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield orjson.loads(line)
+                    except orjson.JSONDecodeError as e:
+                        # A partially written trailing line must not hide the rest of the log
+                        logging.warning(f"Skipping malformed activity record: {str(e)}")
+        except FileNotFoundError as e:
             logging.error(f"Failed to load activity log: {str(e)}")
-            return {"created_at": datetime.now().isoformat(), "activities": []}
 
-    def _save_data(self, data: Dict[str, Any]) -> None:
-        """Save data to the activity log file"""
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        """Return (mtime_ns, size) of the log file, used to detect changes"""
         try:
-            with open(self.log_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            stat = os.stat(self.log_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_activities(self) -> List[Dict[str, Any]]:
+        """
+        Return all activities, oldest first, parsing the log only if it changed
+
+        Buffered records are flushed first so reads always see this instance's
+        own writes. If that flush fails (e.g. the disk is full) the file is read
+        anyway; the records stay buffered for the next flush. The returned list
+        is shared with the cache and must not be mutated.
+        """
+        with self._lock:
+            try:
+                self.flush()
+            except Exception:
+                pass  # flush() already logged it
+
+            signature = self._file_signature()
+            if self._cache is None or signature is None or signature != self._cache_signature:
+                self._cache = list(self._iter_activities())
+                self._cache_signature = signature
+            return self._cache
+
+    @staticmethod
+    def _activity_date(activity: Dict[str, Any]) -> str:
+        """Return the YYYY-MM-DD date of an activity"""
+        # Records written before the "date" field existed fall back to the timestamp
+        return activity.get("date") or activity["timestamp"][:10]
+
+    def _get_date_index(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return activities grouped by YYYY-MM-DD, rebuilding only if the file changed"""
+        with self._lock:
+            activities = self._load_activities()
+            if self._date_index_signature is None or self._date_index_signature != self._cache_signature:
+                date_index: Dict[str, List[Dict[str, Any]]] = {}
+                for activity in activities:
+                    date_index.setdefault(self._activity_date(activity), []).append(activity)
+
+                self._date_index = date_index
+                self._date_index_signature = self._cache_signature
+
+            return self._date_index
+
+    def _get_timestamps(self) -> Tuple[List[str], Optional[List[int]]]:
+        """
+        Return the sorted timestamps and their activity indexes, rebuilding only if the file changed
+
+        The indexes are None when the cached activities are already in
+        timestamp order, so the sorted timestamps line up with them directly.
+        """
+        with self._lock:
+            activities = self._load_activities()
+            if self._timestamps_signature is None or self._timestamps_signature != self._cache_signature:
+                timestamps = [activity["timestamp"] for activity in activities]
+
+                # Records are mostly appended in time order, but overlapping
+                # cycles (or a clock change) can store one out of order
+                if all(a <= b for a, b in zip(timestamps, timestamps[1:])):
+                    self._timestamp_order = None
+                else:
+                    self._timestamp_order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+                    timestamps = [timestamps[i] for i in self._timestamp_order]
+
+                self._timestamps = timestamps
+                self._timestamps_signature = self._cache_signature
+
+            return self._timestamps, self._timestamp_order
+
+    def _insert_timestamp(self, timestamp: str, index: int) -> None:
+        """Add a newly cached activity's timestamp to the sorted view"""
+        timestamps = self._timestamps
+        if not timestamps or timestamp >= timestamps[-1]:
+            # In order: the common append
+            timestamps.append(timestamp)
+            if self._timestamp_order is not None:
+                self._timestamp_order.append(index)
+            return
+
+        # Stored out of order; switch to explicit indexes and insert in place
+        if self._timestamp_order is None:
+            self._timestamp_order = list(range(len(timestamps)))
+        position = bisect.bisect_right(timestamps, timestamp)
+        timestamps.insert(position, timestamp)
+        self._timestamp_order.insert(position, index)
+
+    @staticmethod
+    def _timestamp_ns(activity: Dict[str, Any]) -> int:
+        """Return the epoch nanoseconds of an activity"""
+        # Records written before the "ts_epoch" field existed fall back to parsing the timestamp
+        ts_epoch = activity.get("ts_epoch")
+        if ts_epoch is None:
+            ts_epoch = datetime.fromisoformat(activity["timestamp"]).timestamp()
+        return int(ts_epoch * 1_000_000_000)
+
+    def _get_timestamps_ns(self) -> np.ndarray:
+        """Return epoch nanoseconds parallel to the cached activities, rebuilding only if the file changed"""
+        with self._lock:
+            activities = self._load_activities()
+            if self._ts_ns_signature is None or self._ts_ns_signature != self._cache_signature:
+                self._ts_ns = np.fromiter(
+                    (self._timestamp_ns(activity) for activity in activities),
+                    dtype=np.int64,
+                    count=len(activities)
+                )
+                self._ts_ns_signature = self._cache_signature
+
+            return self._ts_ns
+
+    def _write_activities(self, activities: Iterable[Dict[str, Any]]) -> None:
+        """Atomically replace the log file with the given activities"""
+        temp_file = f"{self.log_file}.tmp"
+        try:
+            activities = list(activities)
+            with open(temp_file, 'wb') as f:
+                for activity in activities:
+                    f.write(orjson.dumps(activity) + b'\n')
+            os.replace(temp_file, self.log_file)
+
+            self._cache = activities
+            self._cache_signature = self._file_signature()
         except Exception as e:
             logging.error(f"Failed to save activity log: {str(e)}")
             raise
@@ -44,17 +246,22 @@ class ActivityStorage:
         Save a new activity record
 
         Args:
-            activity_data (Dict[str, Any]): Activity data to save
+            activity_data (Dict[str, Any]): Activity data to save; an ISO "timestamp"
+                (e.g. the capture time) is used instead of the current time
 
         Returns:
-            bool: True if saved successfully, False otherwise
+            bool: True once the record is buffered for writing, False if it
+                couldn't be built; write failures surface from flush()
         """
         try:
-            data = self._load_data()
-
-            # Create activity record
+            # Create activity record, stamped with the capture time if given
+            timestamp = activity_data.get("timestamp")
+            recorded_at = datetime.fromisoformat(timestamp) if timestamp else datetime.now()
+            timestamp = recorded_at.isoformat()
             activity_record = {
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": timestamp,
+                "date": timestamp[:10],
+                "ts_epoch": recorded_at.timestamp(),
                 "screenshot_path": activity_data.get("screenshot_path"),
                 "activity_description": activity_data.get("activity_description"),
                 "analysis_result": activity_data.get("analysis_result", {}),
@@ -63,11 +270,15 @@ class ActivityStorage:
                 "error": activity_data.get("error")
             }
 
-            # Add to activities list
-            data["activities"].append(activity_record)
-
-            # Save updated data
-            self._save_data(data)
+            # Buffer the record; it is appended together with later ones. Once
+            # buffered it counts as saved: a failed write is logged by flush()
+            # and retried with the next one, so it isn't reported here
+            with self._lock:
+                self._pending.append(activity_record)
+                try:
+                    self._maybe_flush()
+                except Exception:
+                    pass
 
             logging.info(f"Activity saved successfully at {activity_record['timestamp']}")
             return True
@@ -76,6 +287,52 @@ class ActivityStorage:
             logging.error(f"Failed to save activity: {str(e)}")
             return False
 
+    def _maybe_flush(self) -> None:
+        """Flush buffered records once enough have piled up or enough time has passed"""
+        if (len(self._pending) >= Config.ACTIVITY_FLUSH_BATCH_SIZE
+                or time.monotonic() - self._last_flush >= Config.ACTIVITY_FLUSH_INTERVAL):
+            self.flush()
+
+    def flush(self) -> None:
+        """Append all buffered activity records to the log file in one write"""
+        with self._lock:
+            if not self._pending:
+                return
+
+            records = list(self._pending)
+
+            # Append as whole lines; existing records are never rewritten
+            previous_signature = self._file_signature()
+            try:
+                with open(self.log_file, 'ab') as f:
+                    f.write(b''.join(orjson.dumps(record) + b'\n' for record in records))
+            except Exception as e:
+                # Records stay buffered and are retried on the next flush
+                logging.error(f"Failed to flush activity log: {str(e)}")
+                raise
+
+            self._pending.clear()
+            self._last_flush = time.monotonic()
+
+            # Keep the in-memory cache current instead of re-parsing the whole log
+            if self._cache is not None and previous_signature == self._cache_signature:
+                signature = self._file_signature()
+                first_index = len(self._cache)
+                self._cache.extend(records)
+                self._cache_signature = signature
+                if self._date_index_signature == previous_signature:
+                    for record in records:
+                        self._date_index.setdefault(record["date"], []).append(record)
+                    self._date_index_signature = signature
+                if self._timestamps_signature == previous_signature:
+                    for index, record in enumerate(records, first_index):
+                        self._insert_timestamp(record["timestamp"], index)
+                    self._timestamps_signature = signature
+                if self._ts_ns_signature == previous_signature:
+                    new_ts_ns = [self._timestamp_ns(record) for record in records]
+                    self._ts_ns = np.append(self._ts_ns, np.array(new_ts_ns, dtype=np.int64))
+                    self._ts_ns_signature = signature
+
     def get_recent_activities(self, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Get recent activity records
@@ -87,8 +344,7 @@ class ActivityStorage:
             List[Dict[str, Any]]: Recent activities ordered from newest to oldest
         """
         try:
-            data = self._load_data()
-            activities = data.get("activities", [])
+            activities = self._load_activities()
 
             if not activities:
                 return []
@@ -105,10 +361,11 @@ class ActivityStorage:
             if normalized_limit <= 0:
                 return []
 
+            # The slice is already a fresh list, so reverse it in place rather than copying again.
+            # Newest records come first so UIs that slice the first page show recent data.
             recent_activities = activities[-normalized_limit:]
-
-            # Return newest records first so UIs that slice the first page show recent data.
-            return list(reversed(recent_activities))
+            recent_activities.reverse()
+            return recent_activities
 
         except Exception as e:
             logging.error(f"Failed to get recent activities: {str(e)}")
@@ -125,20 +382,40 @@ class ActivityStorage:
             List[Dict[str, Any]]: List of activities for the specified date
         """
         try:
-            data = self._load_data()
-            activities = data.get("activities", [])
+            # Look up the per-day index instead of scanning every record
+            return list(self._get_date_index().get(date_str, []))
+
+        except Exception as e:
+            logging.error(f"Failed to get activities by date: {str(e)}")
+            return []
+
+    def get_activities_in_range(self, start_time: str, end_time: str) -> List[Dict[str, Any]]:
+        """
+        Get activities whose ISO timestamp lies within [start_time, end_time]
+
+        Args:
+            start_time (str): Inclusive ISO-8601 lower bound
+            end_time (str): Inclusive ISO-8601 upper bound
+
+        Returns:
+            List[Dict[str, Any]]: Matching activities ordered from oldest to newest
+        """
+        try:
+            # Hold the lock so a flush can't grow one list but not the other
+            with self._lock:
+                timestamps, order = self._get_timestamps()
+                activities = self._load_activities()
 
-            # Filter activities by date
-            filtered_activities = []
-            for activity in activities:
-                activity_date = activity["timestamp"][:10]  # Extract YYYY-MM-DD
-                if activity_date == date_str:
-                    filtered_activities.append(activity)
+                lo = bisect.bisect_left(timestamps, start_time)
+                hi = bisect.bisect_right(timestamps, end_time)
 
-            return filtered_activities
+                # In-order activities make the range a contiguous slice
+                if order is None:
+                    return activities[lo:hi]
+                return [activities[i] for i in order[lo:hi]]
 
         except Exception as e:
-            logging.error(f"Failed to get activities by date: {str(e)}")
+            logging.error(f"Failed to get activities in range: {str(e)}")
             return []
 
     def get_activity_statistics(self) -> Dict[str, Any]:
@@ -149,10 +426,15 @@ class ActivityStorage:
             Dict[str, Any]: Activity statistics
         """
         try:
-            data = self._load_data()
-            activities = data.get("activities", [])
-
-            if not activities:
+            # A concurrent flush may extend the cached list while it's counted
+            with self._lock:
+                activities = self._load_activities()
+                total_activities = len(activities)
+                successful_analyses = sum(1 for activity in activities if activity.get("analysis_successful", False))
+                first_activity = activities[0]["timestamp"] if activities else None
+                last_activity = activities[-1]["timestamp"] if activities else None
+
+            if not total_activities:
                 return {
                     "total_activities": 0,
                     "successful_analyses": 0,
@@ -162,17 +444,15 @@ class ActivityStorage:
                     "last_activity": None
                 }
 
-            successful_analyses = sum(1 for activity in activities if activity.get("analysis_successful", False))
-            failed_analyses = len(activities) - successful_analyses
-            success_rate = (successful_analyses / len(activities)) * 100 if activities else 0
+            success_rate = (successful_analyses / total_activities) * 100
 
             return {
-                "total_activities": len(activities),
+                "total_activities": total_activities,
                 "successful_analyses": successful_analyses,
-                "failed_analyses": failed_analyses,
+                "failed_analyses": total_activities - successful_analyses,
                 "success_rate": round(success_rate, 2),
-                "first_activity": activities[0]["timestamp"] if activities else None,
-                "last_activity": activities[-1]["timestamp"] if activities else None
+                "first_activity": first_activity,
+                "last_activity": last_activity
             }
 
         except Exception as e:
@@ -190,29 +470,27 @@ class ActivityStorage:
             int: Number of activities removed
         """
         try:
-            data = self._load_data()
-            activities = data.get("activities", [])
-
-            if not activities:
-                return 0
-
             # Calculate cutoff date
-            cutoff_date = datetime.now().timestamp() - (keep_days * 24 * 60 * 60)
+            cutoff_ns = int((datetime.now().timestamp() - (keep_days * 24 * 60 * 60)) * 1_000_000_000)
+
+            # Held from reading to rewriting: a flush in between would leave the
+            # timestamps shorter than the activities, and the rewrite would
+            # drop the freshly flushed records
+            with self._lock:
+                # Filter activities with one vectorized comparison over the cached timestamps
+                timestamps_ns = self._get_timestamps_ns()
+                activities = self._load_activities()
+                original_count = len(activities)
 
-            # Filter activities
-            original_count = len(activities)
-            filtered_activities = []
+                keep_idx = np.flatnonzero(timestamps_ns >= cutoff_ns)
+                filtered_activities = [activities[i] for i in keep_idx.tolist()]
 
-            for activity in activities:
-                activity_timestamp = datetime.fromisoformat(activity["timestamp"]).timestamp()
-                if activity_timestamp >= cutoff_date:
-                    filtered_activities.append(activity)
+                removed_count = original_count - len(filtered_activities)
 
-            # Update data
-            data["activities"] = filtered_activities
-            self._save_data(data)
+                # Only rewrite the log when something actually expired
+                if removed_count:
+                    self._write_activities(filtered_activities)
 
-            removed_count = original_count - len(filtered_activities)
             logging.info(f"Cleaned up {removed_count} old activities")
 
             return removed_count
@@ -221,29 +499,27 @@ class ActivityStorage:
             logging.error(f"Failed to cleanup old activities: {str(e)}")
             return 0
 
-    def export_activities(self, output_file: str, date_range: Optional[tuple] = None) -> bool:
+    def export_activities(self, output_file: str, date_range: Optional[tuple] = None, pretty: bool = False) -> bool:
         """
         Export activities to a separate file
 
         Args:
             output_file (str): Path to output file
             date_range (Optional[tuple]): Optional date range (start_date, end_date)
+            pretty (bool): Indent the JSON for human reading instead of writing it compact
 
         Returns:
             bool: True if exported successfully, False otherwise
         """
         try:
-            data = self._load_data()
-            activities = data.get("activities", [])
-
             if date_range:
                 start_date, end_date = date_range
-                filtered_activities = []
-                for activity in activities:
-                    activity_date = activity["timestamp"][:10]
-                    if start_date <= activity_date <= end_date:
-                        filtered_activities.append(activity)
-                activities = filtered_activities
+                activities = [
+                    activity for activity in self._load_activities()
+                    if start_date <= self._activity_date(activity) <= end_date
+                ]
+            else:
+                activities = self._load_activities()
 
             export_data = {
                 "exported_at": datetime.now().isoformat(),
@@ -251,8 +527,8 @@ class ActivityStorage:
                 "activities": activities
             }
 
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, ensure_ascii=False, indent=2)
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps(export_data, option=orjson.OPT_INDENT_2 if pretty else None))
 
             logging.info(f"Exported {len(activities)} activities to {output_file}")
             return True
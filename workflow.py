@@ -1,7 +1,11 @@
-from typing import Dict, Any, TypedDict
+from typing import Dict, Any, Awaitable, Callable, List, Optional, TypedDict
+from collections import deque
 from langgraph.graph import StateGraph, END
 import logging
 import asyncio
+import itertools
+import threading
+import time
 from datetime import datetime
 
 from screenshot_agent import ScreenshotAgent
@@ -9,15 +13,19 @@ from analysis_agent import AnalysisAgent
 from storage import ActivityStorage
 from config import Config
 
+logger = logging.getLogger(__name__)
+
 class ActivityState(TypedDict):
     """State for the activity recording workflow"""
     screenshot_path: str
-    screenshot_base64: str
+    capture_id: Optional[int]
     activity_description: str
     analysis_result: Dict[str, Any]
     error: str
     success: bool
     timestamp: str
+    timestamp_ns: int
+    dhash: Optional[int]
 
 class ActivityRecorderWorkflow:
     """LangGraph workflow for activity recording"""
@@ -27,47 +35,107 @@ class ActivityRecorderWorkflow:
         self.analysis_agent = AnalysisAgent()
         self.storage = ActivityStorage()
         self.config = Config()
-        self.graph = self._build_workflow()
+
+        # The pipeline is linear, so cycles call the nodes directly; the graph
+        # is only built when USE_LANGGRAPH asks for it
+        self.graph = None
+
+        # Empty state copied at the start of every cycle
+        self._state_template = ActivityState(
+            screenshot_path="",
+            capture_id=None,
+            activity_description="",
+            analysis_result={},
+            error=None,
+            success=False,
+            timestamp="",
+            timestamp_ns=0,
+            dhash=None
+        )
+
+        # Sync nodes run on worker threads, so concurrent cycles (run_batch)
+        # must not touch the storage at the same time
+        self._storage_lock = threading.Lock()
+
+        # Formatted "timestamp: description" entries of the latest activities
+        # (oldest first) and the context string joined from them; loaded from
+        # storage once, then kept current by _store_activity
+        self._context_parts: Optional[deque] = None
+        self._context_str = ""
+        # Concurrent cycles store on worker threads; reentrant because loading
+        # the context adds the stored activities to it
+        self._context_lock = threading.RLock()
+
+        # dHash of the last analyzed screenshot and its result, reused while the screen is unchanged
+        self._last_dhash: Optional[int] = None
+        self._last_analysis: Optional[Dict[str, Any]] = None
+
+        # Base64 images of captured screenshots awaiting analysis, keyed by the
+        # cycle's capture id; kept out of the state so the megabyte-sized string
+        # isn't carried through every node
+        self._screenshot_images: Dict[int, str] = {}
+        self._capture_ids = itertools.count(1)
 
     def _build_workflow(self) -> StateGraph:
         """Build the LangGraph workflow"""
 
         workflow = StateGraph(ActivityState)
 
-        # Add nodes
+        # Add nodes; the blocking ones (model call, file I/O) run on worker threads
         workflow.add_node("capture_screenshot", self._capture_screenshot)
-        workflow.add_node("analyze_activity", self._analyze_activity)
-        workflow.add_node("store_activity", self._store_activity)
-        workflow.add_node("cleanup", self._cleanup)
+        workflow.add_node("analyze_activity", self._in_thread(self._analyze_activity))
+        workflow.add_node("store_activity", self._in_thread(self._store_activity))
 
         # Add edges
         workflow.set_entry_point("capture_screenshot")
-        workflow.add_edge("capture_screenshot", "analyze_activity")
+        workflow.add_conditional_edges(
+            "capture_screenshot",
+            self._route_after_capture,
+            {"analyze_activity": "analyze_activity", END: END}
+        )
         workflow.add_edge("analyze_activity", "store_activity")
-        workflow.add_edge("store_activity", "cleanup")
-        workflow.add_edge("cleanup", END)
+        workflow.add_edge("store_activity", END)
 
         return workflow.compile()
 
-    def _capture_screenshot(self, state: ActivityState) -> ActivityState:
+    @staticmethod
+    def _route_after_capture(state: ActivityState) -> str:
+        """Go on to analysis only if the capture succeeded; a failed cycle stores nothing"""
+        return "analyze_activity" if state.get("success", False) else END
+
+    @staticmethod
+    def _in_thread(node: Callable[[ActivityState], ActivityState]) -> Callable[[ActivityState], Awaitable[ActivityState]]:
+        """Wrap a blocking node as an async node that runs on a worker thread"""
+        async def run(state: ActivityState) -> ActivityState:
+            return await asyncio.to_thread(node, state)
+
+        return run
+
+    async def _capture_screenshot(self, state: ActivityState) -> ActivityState:
         """Capture screenshot node"""
         try:
-            logging.info("Capturing screenshot...")
-            screenshot_path, screenshot_base64 = self.screenshot_agent.capture_screenshot()
+            logger.info("Capturing screenshot...")
+            # Grab, PNG save and JPEG payload run on the agent's capture threads
+            screenshot_path, screenshot_base64, dhash = await self.screenshot_agent.capture_screenshot_async()
+
+            capture_id = next(self._capture_ids)
+            self._screenshot_images[capture_id] = screenshot_base64
 
             state.update({
                 "screenshot_path": screenshot_path,
-                "screenshot_base64": screenshot_base64,
-                "timestamp": datetime.now().isoformat(),
+                "capture_id": capture_id,
+                "dhash": dhash,
+                # Raw clock read; formatted to ISO only when the activity is stored
+                "timestamp_ns": time.time_ns(),
                 "success": True,
                 "error": None
             })
 
-            logging.info(f"Screenshot captured successfully: {screenshot_path}")
+            logger.info("Screenshot captured successfully: %s", screenshot_path)
 
         except Exception as e:
             error_msg = f"Failed to capture screenshot: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             state.update({
                 "error": error_msg,
                 "success": False
@@ -77,21 +145,24 @@ class ActivityRecorderWorkflow:
 
     def _analyze_activity(self, state: ActivityState) -> ActivityState:
         """Analyze activity node"""
-        if not state.get("success", False):
-            return state
-
         try:
-            logging.info("Analyzing activity...")
+            logger.info("Analyzing activity...")
 
-            # Get context from recent activities
-            recent_activities = self.storage.get_recent_activities(limit=5)
-            context = self._build_context(recent_activities)
+            analysis_result = self._reuse_analysis(state)
+            image_base64 = self._take_screenshot_image(state, needed=analysis_result is None)
+            if analysis_result is None:
+                # Get context from recent activities
+                context = self._build_context()
 
-            # Analyze the screenshot
-            analysis_result = self.analysis_agent.analyze_screenshot(
-                state["screenshot_base64"],
-                context
-            )
+                # Analyze the screenshot
+                analysis_result = self.analysis_agent.analyze_screenshot(
+                    image_base64,
+                    context
+                )
+                self._remember_analysis(state, analysis_result)
+
+            # Release the image before the activity is stored
+            del image_base64
 
             state.update({
                 "activity_description": analysis_result["activity_description"],
@@ -99,13 +170,13 @@ class ActivityRecorderWorkflow:
             })
 
             if analysis_result["analysis_successful"]:
-                logging.info(f"Activity analysis successful: {analysis_result['activity_description']}")
+                logger.info("Activity analysis successful: %s", analysis_result["activity_description"])
             else:
-                logging.warning(f"Activity analysis failed: {analysis_result.get('error', 'Unknown error')}")
+                logger.warning("Activity analysis failed: %s", analysis_result.get("error", "Unknown error"))
 
         except Exception as e:
             error_msg = f"Failed to analyze activity: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             state.update({
                 "error": error_msg,
                 "activity_description": "Analysis failed",
@@ -114,12 +185,49 @@ class ActivityRecorderWorkflow:
 
         return state
 
+    def _take_screenshot_image(self, state: ActivityState, needed: bool = True) -> Optional[str]:
+        """
+        Remove and return the base64 image captured for a state
+
+        If the image isn't held (e.g. the state was built elsewhere) and it is
+        needed, it's read back from the screenshot file.
+        """
+        image_base64 = self._screenshot_images.pop(state.get("capture_id"), None)
+        if image_base64 is None and needed:
+            image_base64 = self.screenshot_agent.load_for_upload(state["screenshot_path"])
+        return image_base64
+
+    def _reuse_analysis(self, state: ActivityState) -> Optional[Dict[str, Any]]:
+        """Return a copy of the last analysis if the screen hasn't visibly changed since"""
+        threshold = self.config.SCREENSHOT_DEDUP_THRESHOLD
+        dhash = state.get("dhash")
+        if threshold <= 0 or dhash is None or self._last_dhash is None or self._last_analysis is None:
+            return None
+
+        if (dhash ^ self._last_dhash).bit_count() >= threshold:
+            return None
+
+        logger.info("Screen unchanged since the last analysis, reusing its result")
+        return dict(self._last_analysis)
+
+    def _remember_analysis(self, state: ActivityState, analysis_result: Dict[str, Any]) -> None:
+        """Keep a successful analysis for reuse on unchanged screens"""
+        # Compare later frames against the analyzed one, so slow drift still triggers a new analysis
+        if analysis_result.get("analysis_successful") and state.get("dhash") is not None:
+            self._last_dhash = state["dhash"]
+            self._last_analysis = analysis_result
+
     def _store_activity(self, state: ActivityState) -> ActivityState:
         """Store activity node"""
         try:
-            logging.info("Storing activity...")
+            logger.info("Storing activity...")
+
+            if state.get("timestamp_ns"):
+                state["timestamp"] = datetime.fromtimestamp(state["timestamp_ns"] / 1e9).isoformat()
 
             activity_data = {
+                # Capture time, not store time: a batch is stored all at once
+                "timestamp": state.get("timestamp") or None,
                 "screenshot_path": state.get("screenshot_path"),
                 "activity_description": state.get("activity_description"),
                 "analysis_result": state.get("analysis_result", {}),
@@ -128,101 +236,360 @@ class ActivityRecorderWorkflow:
                 "error": state.get("error")
             }
 
-            success = self.storage.save_activity(activity_data)
+            with self._storage_lock:
+                success = self.storage.save_activity(activity_data)
 
             if success:
-                logging.info("Activity stored successfully")
+                logger.info("Activity stored successfully")
+                self._add_context(state.get("timestamp"), state.get("activity_description"))
             else:
-                logging.error("Failed to store activity")
+                logger.error("Failed to store activity")
 
         except Exception as e:
             error_msg = f"Failed to store activity: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             state.update({"error": error_msg})
 
         return state
 
-    def _cleanup(self, state: ActivityState) -> ActivityState:
-        """Cleanup node"""
+    def _cleanup(self) -> None:
+        """Remove old screenshots and activities"""
         try:
             # Cleanup old screenshots
             self.screenshot_agent.cleanup_old_screenshots(keep_last_n=50)
 
             # Cleanup old activities (keep 30 days)
-            self.storage.cleanup_old_activities(keep_days=30)
+            with self._storage_lock:
+                self.storage.cleanup_old_activities(keep_days=30)
 
-            logging.info("Cleanup completed")
+            logger.info("Cleanup completed")
 
         except Exception as e:
-            logging.warning(f"Cleanup failed: {str(e)}")
+            logger.warning("Cleanup failed: %s", e)
 
-        return state
+    def _flush_activities(self) -> None:
+        """Write out the activities stored by a finished cycle or batch
+
+        Stores within a batch are buffered together; flushing once the batch
+        is done makes its records visible to other readers of the log (and
+        safe from a crash) without waiting for the next save.
+        """
+        try:
+            with self._storage_lock:
+                self.storage.flush()
+        except Exception as e:
+            logger.error("Failed to flush activities: %s", e)
+
+    def _load_context(self) -> deque:
+        """Return the context entries, loading them from storage on first use"""
+        with self._context_lock:
+            if self._context_parts is None:
+                with self._storage_lock:
+                    recent_activities = self.storage.get_recent_activities(limit=5)
+
+                self._context_parts = deque(maxlen=3)  # Use last 3 activities for context
+                for activity in reversed(recent_activities):
+                    self._add_context(activity.get("timestamp", ""), activity.get("activity_description"))
+
+            return self._context_parts
+
+    def _add_context(self, timestamp: str, description: str) -> None:
+        """Append an activity to the context and re-join the context string"""
+        if not description:
+            return
+
+        with self._context_lock:
+            context_parts = self._load_context()
+            context_parts.append(f"{timestamp}: {description}")
+            self._context_str = f"最近的活动: {'; '.join(context_parts)}"
 
-    def _build_context(self, recent_activities: list) -> str:
+    def _build_context(self) -> str:
         """Build context from recent activities"""
-        if not recent_activities:
-            return ""
+        with self._context_lock:
+            self._load_context()
+            return self._context_str
+
+    def _initial_state(self) -> ActivityState:
+        """Create an empty state for a new recording cycle"""
+        # A plain dict copy is cheaper than building the TypedDict each cycle.
+        # The copy is shallow; nodes replace analysis_result rather than mutate it.
+        return self._state_template.copy()
+
+    def _analyze_batch(self, states: List[ActivityState]) -> List[ActivityState]:
+        """Analyze several captured states with one model request"""
+        captured = []
+        for state in states:
+            if not state.get("success", False):
+                continue
+
+            analysis_result = self._reuse_analysis(state)
+            if analysis_result is None:
+                captured.append(state)
+            else:
+                self._take_screenshot_image(state, needed=False)
+                state.update({
+                    "activity_description": analysis_result["activity_description"],
+                    "analysis_result": analysis_result
+                })
+
+        if len(captured) <= 1:
+            for state in captured:
+                self._analyze_activity(state)
+            return states
+
+        try:
+            logger.info("Analyzing %d activities in one batch...", len(captured))
+
+            # Get context from recent activities
+            context = self._build_context()
 
-        context_parts = []
-        for activity in recent_activities[-3:]:  # Use last 3 activities for context
-            if activity.get("activity_description"):
-                timestamp = activity.get("timestamp", "")
-                desc = activity["activity_description"]
-                context_parts.append(f"{timestamp}: {desc}")
+            analysis_results = self.analysis_agent.analyze_screenshots_batch(
+                [self._take_screenshot_image(state) for state in captured],
+                context
+            )
+
+            for state, analysis_result in zip(captured, analysis_results):
+                state.update({
+                    "activity_description": analysis_result["activity_description"],
+                    "analysis_result": analysis_result
+                })
+                self._remember_analysis(state, analysis_result)
+
+        except Exception as e:
+            error_msg = f"Failed to analyze activity: {str(e)}"
+            logger.error(error_msg)
+            for state in captured:
+                state.update({
+                    "error": error_msg,
+                    "activity_description": "Analysis failed",
+                    "analysis_result": {"analysis_successful": False, "error": error_msg}
+                })
+
+        return states
+
+    def _analyze_and_store(self, state: ActivityState) -> ActivityState:
+        """Run the analyze and store nodes on a captured state"""
+        if self._route_after_capture(state) == END:
+            return state
+        state = self._store_activity(self._analyze_activity(state))
+        self._flush_activities()
+        return state
 
-        if context_parts:
-            return f"最近的活动: {'; '.join(context_parts)}"
-        return ""
+    def _process_screenshots(self, states: List[ActivityState]) -> List[ActivityState]:
+        """Run the analyze and store nodes on a batch of captured states"""
+        states = self._analyze_batch(states)
+        states = [
+            self._store_activity(state) if self._route_after_capture(state) != END else state
+            for state in states
+        ]
+        self._flush_activities()
+        return states
 
     async def run_single_cycle(self) -> Dict[str, Any]:
         """Run a single activity recording cycle"""
         try:
-            logging.info("Starting activity recording cycle...")
-
-            # Initialize state
-            initial_state = ActivityState(
-                screenshot_path="",
-                screenshot_base64="",
-                activity_description="",
-                analysis_result={},
-                error=None,
-                success=False,
-                timestamp=""
-            )
-
-            # Run the workflow
-            result = await self.graph.ainvoke(initial_state)
+            logger.info("Starting activity recording cycle...")
+
+            if self.config.USE_LANGGRAPH:
+                # Run the workflow
+                if self.graph is None:
+                    self.graph = self._build_workflow()
+                result = await self.graph.ainvoke(self._initial_state())
+                await asyncio.to_thread(self._flush_activities)
+            else:
+                # Same nodes as the graph, chained directly; the blocking ones
+                # share a single worker-thread hop
+                state = await self._capture_screenshot(self._initial_state())
+                result = await asyncio.to_thread(self._analyze_and_store, state)
 
-            logging.info("Activity recording cycle completed")
+            logger.info("Activity recording cycle completed")
             return result
 
         except Exception as e:
             error_msg = f"Activity recording cycle failed: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             return {"error": error_msg, "success": False}
 
-    async def run_continuous(self) -> None:
-        """Run continuous activity recording"""
-        logging.info(f"Starting continuous activity recording (interval: {self.config.get_screenshot_interval()}s)")
+    async def run_batch(self, n: int, concurrency: int = 8) -> List[Dict[str, Any]]:
+        """
+        Run n recording cycles concurrently
+
+        Every cycle captures the screen as it is when the cycle starts, so this
+        can't backfill missed intervals. It's a throughput helper for running
+        several full cycles at once (e.g. to load-test the analysis and storage
+        path); the recording loops don't use it.
+
+        Args:
+            n (int): Number of cycles to run
+            concurrency (int): Maximum number of cycles in flight at once
+
+        Returns:
+            List[Dict[str, Any]]: One cycle result per cycle
+        """
+        logger.info("Running %d recording cycles (concurrency: %d)", n, concurrency)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_cycle() -> Dict[str, Any]:
+            async with semaphore:
+                return await self.run_single_cycle()
+
+        results = await asyncio.gather(*(run_cycle() for _ in range(n)), return_exceptions=True)
+
+        return [
+            {"error": f"Activity recording cycle failed: {str(result)}", "success": False}
+            if isinstance(result, BaseException) else result
+            for result in results
+        ]
+
+    async def run_periodic_cleanup(self, interval: Optional[int] = None) -> None:
+        """
+        Clean up old screenshots and activities now and then every interval
+
+        Runs until cancelled; recording loops (and the native host, for its
+        whole lifetime) start it next to their cycles so cleanup stays off the
+        per-cycle path.
+
+        Args:
+            interval (Optional[int]): Seconds between cleanups, defaults to Config.CLEANUP_INTERVAL
+        """
+        if interval is None:
+            interval = self.config.CLEANUP_INTERVAL
+
+        while True:
+            await self.run_cleanup()
+            await asyncio.sleep(interval)
+
+    async def run_cleanup(self) -> None:
+        """Clean up old screenshots and activities once, on a worker thread"""
+        await asyncio.to_thread(self._cleanup)
+
+    async def _capture_stage(self, queue: asyncio.Queue, leftovers: List[ActivityState]) -> None:
+        """Pipeline stage: capture a screenshot every interval and hand it on"""
+        loop = asyncio.get_running_loop()
+        next_deadline = loop.time()
+
+        while True:
+            state = await self._capture_screenshot(self._initial_state())
+
+            # Blocks while the analysis stage is behind, so screenshots can't pile up
+            try:
+                await queue.put(state)
+            except asyncio.CancelledError:
+                # Stopped while waiting for room; run_continuous still stores it
+                leftovers.append(state)
+                raise
+
+            # Wait for the next deadline rather than a full interval, so capture
+            # time doesn't make the cadence drift
+            interval = self.config.get_screenshot_interval()
+            next_deadline += interval
+            sleep_for = next_deadline - loop.time()
+            if sleep_for > 0:
+                await asyncio.sleep(sleep_for)
+            elif interval > 0:
+                # Fell behind (e.g. waiting on a slow analysis); skip the missed
+                # slots instead of capturing back to back to catch up
+                missed = int(-sleep_for // interval) + 1
+                next_deadline += interval * missed
+                logger.warning("Recording fell behind schedule, skipping %d missed cycle(s)", missed)
+                await asyncio.sleep(next_deadline - loop.time())
+
+    async def _analysis_stage(self, queue: asyncio.Queue, leftovers: List[ActivityState]) -> None:
+        """Pipeline stage: analyze and store captured screenshots"""
+        loop = asyncio.get_running_loop()
+        batch: List[ActivityState] = []
 
         try:
             while True:
-                # Run single cycle
-                result = await self.run_single_cycle()
+                batch.append(await queue.get())
+
+                # Collect up to batch_size screenshots for one request, but don't
+                # hold the first one back for longer than the max delay
+                batch_size = self.config.get_analysis_batch_size()
+                deadline = loop.time() + self.config.ANALYSIS_BATCH_MAX_DELAY
+                while len(batch) < batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    # asyncio.timeout rather than wait_for: on 3.11, wait_for can turn
+                    # a cancellation racing the timeout into a TimeoutError, which would
+                    # swallow the TaskGroup's cancel and hang shutdown
+                    try:
+                        async with asyncio.timeout(timeout):
+                            batch.append(await queue.get())
+                    except TimeoutError:
+                        break
+
+                # The analysis call blocks, so keep it off the loop the capture
+                # stage runs on. The batch is handed over first: once the thread
+                # has it, it gets stored even if the stage is cancelled meanwhile
+                collected, batch = batch, []
+                results = await asyncio.to_thread(self._process_screenshots, collected)
+
+                for result in results:
+                    if result.get("success", False):
+                        logger.info("Cycle completed successfully: %s", result.get("activity_description", "No description"))
+                    else:
+                        logger.error("Cycle failed: %s", result.get("error", "Unknown error"))
+
+        finally:
+            # Screenshots still waiting for their batch when the stage stops
+            # are handed back to run_continuous instead of being dropped
+            leftovers.extend(batch)
+
+    async def run_continuous(self) -> None:
+        """
+        Run continuous activity recording
 
-                if result.get("success", False):
-                    logging.info(f"Cycle completed successfully: {result.get('activity_description', 'No description')}")
-                else:
-                    logging.error(f"Cycle failed: {result.get('error', 'Unknown error')}")
+        Capture and analysis run as two pipelined stages joined by a bounded
+        queue, so the next screenshot is taken on schedule while the previous
+        one is still being analyzed. On stop, screenshots still queued or
+        waiting for their batch are analyzed and stored before returning.
+        """
+        logger.info("Starting continuous activity recording (interval: %ss)", self.config.get_screenshot_interval())
 
-                # Wait for next cycle
-                await asyncio.sleep(self.config.get_screenshot_interval())
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+        leftovers: List[ActivityState] = []
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self._capture_stage(queue, leftovers))
+                tg.create_task(self._analysis_stage(queue, leftovers))
+                tg.create_task(self.run_periodic_cleanup())
 
         except KeyboardInterrupt:
-            logging.info("Activity recording stopped by user")
+            logger.info("Activity recording stopped by user")
         except Exception as e:
-            logging.error(f"Continuous recording failed: {str(e)}")
+            logger.error("Continuous recording failed: %s", e)
             raise
+        finally:
+            try:
+                await self._process_leftovers(queue, leftovers)
+            finally:
+                # Drop images of captures that were never analyzed
+                self._screenshot_images.clear()
+                self.analysis_agent.close()
+
+    async def _process_leftovers(self, queue: asyncio.Queue, leftovers: List[ActivityState]) -> None:
+        """Analyze and store the screenshots the stopped pipeline still held"""
+        while not queue.empty():
+            leftovers.append(queue.get_nowait())
+        if not leftovers:
+            return
+
+        leftovers.sort(key=lambda state: state.get("timestamp_ns") or 0)
+        logger.info("Analyzing %d pending screenshot(s) before stopping", len(leftovers))
+
+        # Shielded so a stop doesn't lose the screenshots a second time; the
+        # worker thread finishes storing them even if this await is cancelled
+        await asyncio.shield(asyncio.to_thread(self._process_leftover_batches, leftovers))
+
+    def _process_leftover_batches(self, leftovers: List[ActivityState]) -> None:
+        """Process leftover screenshots in batches of the configured size"""
+        batch_size = self.config.get_analysis_batch_size()
+        for start in range(0, len(leftovers), batch_size):
+            self._process_screenshots(leftovers[start:start + batch_size])
 
     def get_statistics(self) -> Dict[str, Any]:
         """Get activity recording statistics"""